@@ -0,0 +1,577 @@
+# ============================================
+# ANALYTICS : CŒUR DE CALCUL SANS STREAMLIT
+# ============================================
+# KPIs, métriques de risque, courbe d'equity et dimensionnement de positions.
+# Importable sans effet de bord (pas de page, de cookies ni de connexion base) :
+# utilisé par app.py, par le rapport en lot (report.py) et par les benchmarks.
+import copy
+import hashlib
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+# lot_step / min_lot / max_lot : contraintes broker sur la taille des ordres
+ASSET_CONFIG = {
+    "XAUUSD": {"name": "Gold", "point_value": 100.0, "currency": "$", "lot_step": 0.01, "min_lot": 0.01, "max_lot": 100.0},
+    "DJ30": {"name": "Dow Jones 30", "point_value": 5.0, "currency": "$", "lot_step": 0.1, "min_lot": 0.1, "max_lot": 50.0},
+    "DAX40": {"name": "DAX 40", "point_value": 25.0, "currency": "€", "lot_step": 0.1, "min_lot": 0.1, "max_lot": 50.0},
+    "NAS100": {"name": "Nasdaq 100", "point_value": 20.0, "currency": "$", "lot_step": 0.1, "min_lot": 0.1, "max_lot": 50.0},
+    "BTCUSD": {"name": "Bitcoin", "point_value": 1.0, "currency": "$", "lot_step": 0.01, "min_lot": 0.01, "max_lot": 10.0},
+    "ETHUSD": {"name": "Ethereum", "point_value": 1.0, "currency": "$", "lot_step": 0.1, "min_lot": 0.1, "max_lot": 100.0}
+}
+
+# ============================================
+# TRADES TYPÉS
+# ============================================
+# Colonnes gardées en mémoire : tout ce dont ont besoin KPIs, risque, equity et import
+TRADE_FRAME_COLUMNS = ['id', 'account_id', 'date', 'pair', 'direction', 'entry_price', 'exit_price', 'lots', 'result']
+# Catégories fixes triées : les concat gardent le type catégoriel et l'ordre
+# des codes est alphabétique (même ordre que les agrégats SQL)
+TRADE_PAIRS = sorted(ASSET_CONFIG)
+TRADE_DIRECTIONS = ['Long', 'Short']
+
+def trade_set_version(trades_df):
+    # Version d'un jeu de trades typé (typed_trades) : nombre de lignes, plus grand id et
+    # somme de contrôle des colonnes affichées. Change à tout ajout, suppression ou modification.
+    if trades_df.empty:
+        return "0"
+    digest = hashlib.blake2b(digest_size=8)
+    for column in ('id', 'account_id', 'date', 'result', 'lots'):
+        digest.update(np.ascontiguousarray(trades_df[column].to_numpy()).tobytes())
+    for column in ('pair', 'direction'):
+        digest.update(trades_df[column].cat.codes.to_numpy().tobytes())
+        digest.update("|".join(trades_df[column].cat.categories).encode('utf-8'))
+    return f"{len(trades_df)}-{int(trades_df['id'].max())}-{digest.hexdigest()}"
+
+def _categorical(values, categories):
+    # Symboles hors ASSET_CONFIG (anciens trades) ajoutés aux catégories plutôt que perdus
+    extra = set(values.dropna().unique()) - set(categories)
+    return values.astype(pd.CategoricalDtype(sorted(set(categories) | extra) if extra else categories))
+
+def typed_trades(trades_df):
+    # DataFrame compact : date parsée une seule fois (datetime64), actif/direction catégoriels,
+    # prix/lots en float32 (7 chiffres significatifs : assez pour le dédoublonnage), résultat en float64.
+    # account_id : 0 pour un trade sans compte (historique antérieur aux comptes, export CSV)
+    trades_df = trades_df.reindex(columns=TRADE_FRAME_COLUMNS)
+    dates = trades_df['date']
+    return pd.DataFrame({
+        'id': trades_df['id'].astype(np.int64),
+        'account_id': trades_df['account_id'].fillna(0).astype(np.int64),
+        'date': dates if pd.api.types.is_datetime64_dtype(dates) else pd.to_datetime(dates, format='ISO8601'),
+        'pair': _categorical(trades_df['pair'], TRADE_PAIRS),
+        'direction': _categorical(trades_df['direction'], TRADE_DIRECTIONS),
+        'entry_price': trades_df['entry_price'].astype(np.float32),
+        'exit_price': trades_df['exit_price'].astype(np.float32),
+        'lots': trades_df['lots'].astype(np.float32),
+        'result': trades_df['result'].astype(np.float64),
+    })
+
+def merge_trades(trades_df, rows):
+    # Fusionne des lignes dans le DataFrame (dédoublonnage par id), tri date/id décroissant
+    if not rows:
+        return trades_df
+    new_df = typed_trades(pd.DataFrame(rows))
+    if not trades_df.empty:
+        merged = pd.concat([trades_df, new_df], ignore_index=True).drop_duplicates('id', keep='last')
+        # Catégories différentes (symbole inconnu d'un côté) : concat repasse en object
+        new_df = merged if (merged.dtypes == new_df.dtypes).all() else typed_trades(merged)
+    return new_df.sort_values(['date', 'id'], ascending=False, ignore_index=True)
+
+# ============================================
+# KPIS
+# ============================================
+EMPTY_KPIS = {'winrate': 0, 'profit_factor': 0, 'biggest_win': 0, 'biggest_loss': 0,
+              'total_trades': 0, 'avg_win': 0, 'avg_loss': 0, 'total_pnl': 0,
+              'by_direction': {}, 'by_pair': {}}
+
+def _group_kpis(count, wins, pnl, gains, losses):
+    # count/wins/pnl/gains/losses : agrégats d'un groupe (scalaires NumPy)
+    profit_factor = gains / -losses if losses < 0 else (gains if gains > 0 else 0)
+    return {'trades': int(count), 'pnl': float(pnl),
+            'winrate': float(wins / count * 100) if count else 0.0,
+            'profit_factor': float(profit_factor)}
+
+def _kpis_from_groups(pair_labels, stats, biggest_win, biggest_loss):
+    # stats : {'trades', 'wins', 'losers', 'pnl', 'gains', 'losses'} -> tableaux (n_actifs, 2)
+    # colonne 0 = Long, colonne 1 = Short. Partagé par le moteur local et les vues SQL.
+    count, wins, pnl, gains, losses = (stats[k] for k in ('trades', 'wins', 'pnl', 'gains', 'losses'))
+    n_trades = int(count.sum())
+    if n_trades == 0:
+        return EMPTY_KPIS
+
+    n_wins = wins.sum()
+    n_losses = stats['losers'].sum()
+    total_gains = gains.sum()
+    total_losses = losses.sum()
+    overall = _group_kpis(n_trades, n_wins, pnl.sum(), total_gains, total_losses)
+
+    by_direction = {}
+    for col, direction in enumerate(('Long', 'Short')):
+        if count[:, col].sum():
+            by_direction[direction] = _group_kpis(count[:, col].sum(), wins[:, col].sum(), pnl[:, col].sum(),
+                                                  gains[:, col].sum(), losses[:, col].sum())
+    by_pair = {
+        str(pair): _group_kpis(count[i].sum(), wins[i].sum(), pnl[i].sum(), gains[i].sum(), losses[i].sum())
+        for i, pair in enumerate(pair_labels)
+    }
+
+    return {
+        'winrate': overall['winrate'],
+        'profit_factor': overall['profit_factor'],
+        'biggest_win': float(biggest_win),
+        'biggest_loss': float(biggest_loss),
+        'total_trades': n_trades,
+        'avg_win': float(total_gains / n_wins) if n_wins else 0,
+        'avg_loss': float(total_losses / n_losses) if n_losses else 0,
+        'total_pnl': overall['pnl'],
+        'by_direction': by_direction,
+        'by_pair': by_pair,
+    }
+
+def calculate_kpis(trades_df):
+    # Moteur KPI : tout est calculé à partir des tableaux NumPy result/direction/pair,
+    # sans DataFrame intermédiaire. Un seul bincount par agrégat sur la clé composite
+    # (actif, direction) ; les totaux globaux et par direction en sont déduits.
+    if trades_df.empty:
+        return EMPTY_KPIS
+
+    result = trades_df['result'].to_numpy(dtype=np.float64)
+    is_short = (trades_df['direction'] == 'Short').to_numpy().astype(np.intp)
+    pair_codes, pair_labels = pd.factorize(trades_df['pair'], sort=True)
+    group = pair_codes * 2 + is_short
+    n_groups = len(pair_labels) * 2
+
+    is_win = result > 0
+    is_loss = result < 0
+    weights = {
+        'trades': None,
+        'wins': is_win,
+        'losers': is_loss,
+        'pnl': result,
+        'gains': np.where(is_win, result, 0.0),
+        'losses': np.where(is_loss, result, 0.0),
+    }
+    stats = {key: np.bincount(group, weights=w, minlength=n_groups).reshape(-1, 2) for key, w in weights.items()}
+    return _kpis_from_groups(pair_labels, stats, result.max(), result.min())
+
+def kpis_from_group_stats(rows):
+    # rows : agrégats par (actif, direction) de la vue SQL (GROUP_STAT_COLUMNS de storage.py)
+    pair_labels = sorted({row['pair'] for row in rows})
+    pair_index = {pair: i for i, pair in enumerate(pair_labels)}
+    stats = {key: np.zeros((len(pair_labels), 2)) for key in ('trades', 'wins', 'losers', 'pnl', 'gains', 'losses')}
+    for row in rows:
+        i, j = pair_index[row['pair']], 1 if row['direction'] == 'Short' else 0
+        for key in stats:
+            stats[key][i, j] += float(row[key] or 0)
+    return _kpis_from_groups(pair_labels, stats, max(row['biggest_win'] for row in rows),
+                             min(row['biggest_loss'] for row in rows))
+
+def result_histogram(results, bins: int = 20):
+    # Même découpage que la fonction SQL trades_result_histogram
+    counts, edges = np.histogram(results, bins=bins)
+    return {'lower': edges[:-1].tolist(), 'upper': edges[1:].tolist(), 'count': counts.tolist()}
+
+def histogram_from_buckets(buckets, bins: int):
+    # buckets : intervalles non vides renvoyés par la base -> même format que result_histogram
+    first = buckets[0]
+    width = first['upper_bound'] - first['lower_bound']
+    lo = first['lower_bound'] - (first['bucket'] - 1) * width
+    counts = [0] * bins
+    for bucket in buckets:
+        counts[bucket['bucket'] - 1] = bucket['trades']
+    return {'lower': [lo + k * width for k in range(bins)],
+            'upper': [lo + (k + 1) * width for k in range(bins)],
+            'count': counts}
+
+def aggregates_version(rows, buckets):
+    # Empreinte du contenu des agrégats serveur (vues SQL + histogramme), indépendante de
+    # l'ordre des lignes : clé des figures dérivées, change dès que la base change
+    canonical = json.dumps([sorted(json.dumps(row, sort_keys=True, default=str) for row in part)
+                            for part in (rows, buckets)])
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()
+
+# ============================================
+# MÉTRIQUES DE RISQUE (DRAWDOWN, SHARPE, STREAKS)
+# ============================================
+TRADING_DAYS_PER_YEAR = 252
+
+class RiskMetrics:
+    # Métriques de risque sur la courbe d'equity (P&L cumulé, trades triés par date puis id).
+    # from_trades() : backfill vectorisé ; extended() : copie mise à jour en O(1) par trade.
+    # Tout est exprimé en P&L : le capital de départ n'intervient qu'à l'affichage (summary).
+    def __init__(self):
+        self.n = 0
+        self.pnl_sum = 0.0
+        self.n_wins = 0
+        self.gains = 0.0
+        self.n_losses = 0
+        self.losses = 0.0
+        self.biggest_win = 0.0
+        self.biggest_loss = 0.0
+        self.equity = 0.0
+        self.peak = 0.0
+        self.peak_day = None
+        self.max_drawdown = 0.0
+        self.peak_at_max_drawdown = 0.0
+        self.longest_drawdown_days = 0
+        self.streak = 0  # > 0 : série gagnante en cours, < 0 : série perdante
+        self.longest_win_streak = 0
+        self.longest_loss_streak = 0
+        self.last_day = None
+        self.last_day_pnl = 0.0
+        self.n_days = 0
+        self.daily_sum = 0.0
+        self.daily_sumsq = 0.0
+        self.daily_downside_sq = 0.0
+
+    @classmethod
+    def from_trades(cls, trades_df):
+        if trades_df.empty:
+            return cls()
+        days = pd.to_datetime(trades_df['date']).to_numpy().astype('datetime64[D]')
+        order = np.lexsort((trades_df['id'].to_numpy(), days))
+        return cls.from_arrays(days[order], trades_df['result'].to_numpy(dtype=np.float64)[order])
+
+    @classmethod
+    def from_arrays(cls, days, results):
+        # days (datetime64[D]) et results doivent être triés chronologiquement
+        state = cls()
+        n = len(results)
+        if n == 0:
+            return state
+
+        state.n = n
+        state.pnl_sum = float(results.sum())
+        is_win = results > 0
+        is_loss = results < 0
+        state.n_wins = int(is_win.sum())
+        state.gains = float(results[is_win].sum())
+        state.n_losses = int(is_loss.sum())
+        state.losses = float(results[is_loss].sum())
+        state.biggest_win = float(max(results.max(), 0.0))
+        state.biggest_loss = float(min(results.min(), 0.0))
+
+        # Equity et drawdown (le capital initial est le premier plus-haut)
+        equity = np.cumsum(results)
+        running_peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+        drawdown = running_peak - equity
+        last_peak = np.maximum.accumulate(np.where(equity >= running_peak, np.arange(n), -1))
+        peak_days = np.where(last_peak >= 0, days[last_peak.clip(0)], days[0])
+        state.equity = float(equity[-1])
+        state.peak = float(running_peak[-1])
+        state.peak_day = peak_days[-1]
+        state.max_drawdown = float(drawdown.max())
+        if state.max_drawdown > 0:
+            state.peak_at_max_drawdown = float(running_peak[drawdown.argmax()])
+        state.longest_drawdown_days = int((days - peak_days).astype(np.int64).max())
+
+        # Séries : longueurs des plages de signe constant
+        sign = np.sign(results)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sign)) + 1))
+        lengths = np.diff(np.append(starts, n))
+        run_sign = sign[starts]
+        state.longest_win_streak = int(lengths[run_sign > 0].max(initial=0))
+        state.longest_loss_streak = int(lengths[run_sign < 0].max(initial=0))
+        state.streak = int(lengths[-1] * run_sign[-1])
+
+        # Agrégats journaliers (Sharpe / Sortino)
+        unique_days, first_index = np.unique(days, return_index=True)
+        daily = np.add.reduceat(results, first_index)
+        state.last_day = unique_days[-1]
+        state.last_day_pnl = float(daily[-1])
+        state.n_days = len(daily)
+        state.daily_sum = float(daily.sum())
+        state.daily_sumsq = float((daily ** 2).sum())
+        state.daily_downside_sq = float((np.minimum(daily, 0.0) ** 2).sum())
+        return state
+
+    def extended(self, days, results):
+        # Renvoie une copie prolongée des nouveaux trades, ou None s'ils ne sont pas
+        # postérieurs au dernier jour connu (un backfill complet est alors nécessaire)
+        if self.last_day is not None and len(days) and days.min() < self.last_day:
+            return None
+        state = copy.copy(self)
+        order = np.argsort(days, kind='stable')
+        for day, result in zip(days[order], results[order]):
+            state._add(day, float(result))
+        return state
+
+    def _add(self, day, result):
+        self.n += 1
+        self.pnl_sum += result
+        if result > 0:
+            self.n_wins += 1
+            self.gains += result
+            self.biggest_win = max(self.biggest_win, result)
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+            self.longest_win_streak = max(self.longest_win_streak, self.streak)
+        elif result < 0:
+            self.n_losses += 1
+            self.losses += result
+            self.biggest_loss = min(self.biggest_loss, result)
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+            self.longest_loss_streak = max(self.longest_loss_streak, -self.streak)
+        else:
+            self.streak = 0
+
+        if self.peak_day is None:
+            self.peak_day = day
+        self.equity += result
+        if self.equity >= self.peak:
+            self.peak = self.equity
+            self.peak_day = day
+        elif self.peak - self.equity > self.max_drawdown:
+            self.max_drawdown = self.peak - self.equity
+            self.peak_at_max_drawdown = self.peak
+        self.longest_drawdown_days = max(self.longest_drawdown_days, int((day - self.peak_day).astype(np.int64)))
+
+        if day == self.last_day:
+            # On remplace la contribution du jour en cours
+            self.daily_sumsq -= self.last_day_pnl ** 2
+            self.daily_downside_sq -= min(self.last_day_pnl, 0.0) ** 2
+            self.last_day_pnl += result
+        else:
+            self.n_days += 1
+            self.last_day = day
+            self.last_day_pnl = result
+        self.daily_sum += result
+        self.daily_sumsq += self.last_day_pnl ** 2
+        self.daily_downside_sq += min(self.last_day_pnl, 0.0) ** 2
+
+    def summary(self, capital: float):
+        if self.n == 0:
+            return None
+        avg_loss = self.losses / self.n_losses if self.n_losses else 0.0
+        avg_win = self.gains / self.n_wins if self.n_wins else 0.0
+        expectancy = self.pnl_sum / self.n
+        # 1R = perte moyenne (le journal ne stocke pas le stop initial)
+        r_unit = -avg_loss
+
+        daily_mean = self.daily_sum / self.n_days
+        daily_var = (self.daily_sumsq - self.n_days * daily_mean ** 2) / (self.n_days - 1) if self.n_days > 1 else 0.0
+        daily_std = math.sqrt(max(daily_var, 0.0))
+        downside_dev = math.sqrt(max(self.daily_downside_sq, 0.0) / self.n_days)
+        annualize = math.sqrt(TRADING_DAYS_PER_YEAR)
+
+        current_drawdown = self.peak - self.equity
+        current_drawdown_days = int((self.last_day - self.peak_day).astype(np.int64)) if current_drawdown > 0 else 0
+        max_dd_base = capital + self.peak_at_max_drawdown
+        current_dd_base = capital + self.peak
+
+        return {
+            'max_drawdown': self.max_drawdown,
+            'max_drawdown_pct': self.max_drawdown / max_dd_base * 100 if max_dd_base > 0 else 0.0,
+            'current_drawdown': current_drawdown,
+            'current_drawdown_pct': current_drawdown / current_dd_base * 100 if current_dd_base > 0 else 0.0,
+            'current_drawdown_days': current_drawdown_days,
+            'longest_drawdown_days': self.longest_drawdown_days,
+            'sharpe': daily_mean / daily_std * annualize if daily_std > 0 else 0.0,
+            'sortino': daily_mean / downside_dev * annualize if downside_dev > 0 else 0.0,
+            'expectancy': expectancy,
+            'expectancy_r': expectancy / r_unit if r_unit > 0 else 0.0,
+            'avg_win_r': avg_win / r_unit if r_unit > 0 else 0.0,
+            'best_trade_r': self.biggest_win / r_unit if r_unit > 0 else 0.0,
+            'worst_trade_r': self.biggest_loss / r_unit if r_unit > 0 else 0.0,
+            'longest_win_streak': self.longest_win_streak,
+            'longest_loss_streak': self.longest_loss_streak,
+            'current_streak': self.streak,
+        }
+
+def equity_curve(trades_df, start_capital: float = 0.0):
+    # (jours datetime64[D], equity) triés chronologiquement (date puis id)
+    days = pd.to_datetime(trades_df['date']).to_numpy().astype('datetime64[D]')
+    order = np.lexsort((trades_df['id'].to_numpy(), days))
+    return days[order], trades_df['result'].to_numpy(dtype=np.float64)[order].cumsum() + start_capital
+
+def trade_report(trades_df, capital: float):
+    # Rapport complet d'un compte : {'kpis', 'risk'} (risk None si aucun trade)
+    return {'kpis': calculate_kpis(trades_df), 'risk': RiskMetrics.from_trades(trades_df).summary(capital)}
+
+# ============================================
+# PORTEFEUILLE (PLUSIEURS COMPTES)
+# ============================================
+def portfolio_equity(trades_df, capitals):
+    # Equity journalière de chaque compte sur le calendrier commun (jours où au moins un compte
+    # a tradé) : un seul bincount somme le P&L par (compte, jour), puis cumsum par ligne. Un
+    # compte qui ne trade pas un jour garde son dernier niveau ; la somme des lignes est le total.
+    # trades_df : trades typés (non vide) ; capitals : {account_id: capital de départ}, les comptes
+    # sans trade y figurent aussi (courbe plate). Renvoie des tableaux alignés sur account_ids.
+    account_ids = np.union1d(np.fromiter(capitals, dtype=np.int64, count=len(capitals)),
+                             trades_df['account_id'].to_numpy())
+    days, day_index = np.unique(pd.to_datetime(trades_df['date']).to_numpy().astype('datetime64[D]'),
+                                return_inverse=True)
+    account_index = np.searchsorted(account_ids, trades_df['account_id'].to_numpy())
+    result = trades_df['result'].to_numpy(dtype=np.float64)
+    n_accounts, n_days = len(account_ids), len(days)
+    daily = np.bincount(account_index * n_days + day_index, weights=result,
+                        minlength=n_accounts * n_days).reshape(n_accounts, n_days)
+    start = np.array([capitals.get(int(account_id), 0.0) for account_id in account_ids], dtype=np.float64)
+    equity = daily.cumsum(axis=1) + start[:, None]
+    return {'account_ids': account_ids, 'days': days, 'equity': equity, 'total': equity.sum(axis=0),
+            'start': start,
+            'trades': np.bincount(account_index, minlength=n_accounts),
+            'wins': np.bincount(account_index[result > 0], minlength=n_accounts),
+            'pnl': np.bincount(account_index, weights=result, minlength=n_accounts)}
+
+# ============================================
+# ANALYSE TEMPORELLE (ROLLUP JOUR / HEURE)
+# ============================================
+ROLLUP_STAT_COLUMNS = ['trades', 'wins', 'losers', 'pnl', 'gains', 'losses']
+WEEKDAY_LABELS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+# Session de chaque heure UTC du trade, sans chevauchement : le recouvrement
+# Londres / New York est compté en New York, la nuit européenne en Asie
+TRADING_SESSIONS = {'Asie': (21, 7), 'Londres': (7, 12), 'New York': (12, 21)}
+
+def trading_sessions(hours):
+    # hours : heures UTC (0-23) -> nom de session
+    labels = np.empty(len(hours), dtype=object)
+    for name, (start, end) in TRADING_SESSIONS.items():
+        labels[(hours >= start) & (hours < end) if start < end else (hours >= start) | (hours < end)] = name
+    return labels
+
+def _bucket_stats(sums):
+    # sums : sommes de ROLLUP_STAT_COLUMNS par intervalle -> + winrate, expectancy, profit factor
+    trades, wins = sums['trades'].to_numpy(dtype=np.float64), sums['wins'].to_numpy(dtype=np.float64)
+    gains, losses = sums['gains'].to_numpy(dtype=np.float64), sums['losses'].to_numpy(dtype=np.float64)
+    return sums.assign(
+        winrate=np.divide(wins * 100, trades, out=np.zeros_like(trades), where=trades > 0),
+        expectancy=np.divide(sums['pnl'].to_numpy(dtype=np.float64), trades, out=np.zeros_like(trades), where=trades > 0),
+        profit_factor=np.where(losses < 0, np.divide(gains, -losses, out=np.zeros_like(gains), where=losses < 0),
+                               np.maximum(gains, 0)),
+    )
+
+def time_buckets(rollup):
+    # rollup : lignes de trades_hourly_rollup {'date', 'hour', ROLLUP_STAT_COLUMNS...}, une par
+    # (jour, heure UTC), heure -1 si le trade n'a pas de timestamp. Renvoie None si vide, sinon
+    # {'day', 'month', 'weekday', 'hour', 'session'} -> DataFrames indexés par intervalle
+    # (sommes, winrate, expectancy, profit_factor) et 'version' : empreinte du rollup.
+    if not rollup:
+        return None
+    df = pd.DataFrame(rollup).reindex(columns=['date', 'hour', *ROLLUP_STAT_COLUMNS])
+    stats = df[ROLLUP_STAT_COLUMNS]
+    days = pd.to_datetime(df['date'], format='ISO8601')
+    hours = df['hour'].to_numpy(dtype=np.int64)
+    timed = hours >= 0
+    timed_stats, timed_hours = stats[timed].reset_index(drop=True), hours[timed]
+    weekdays = pd.Categorical.from_codes(days.dt.weekday, WEEKDAY_LABELS)
+    sessions = pd.Categorical(trading_sessions(timed_hours), categories=list(TRADING_SESSIONS))
+    groups = {
+        'day': stats.groupby(days.rename('date')),
+        'month': stats.groupby(days.dt.to_period('M').dt.to_timestamp().rename('month')),
+        'weekday': stats.groupby(pd.Series(weekdays, name='weekday'), observed=True),
+        'hour': timed_stats.groupby(pd.Series(timed_hours, name='hour')),
+        'session': timed_stats.groupby(pd.Series(sessions, name='session'), observed=True),
+    }
+    buckets = {name: _bucket_stats(group.sum()) for name, group in groups.items()}
+    buckets['version'] = hashlib.blake2b(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes(),
+                                         digest_size=8).hexdigest()
+    return buckets
+
+# ============================================
+# DOWNSAMPLING DE LA COURBE D'EQUITY
+# ============================================
+def drawdown_extremes(equity):
+    # Indices du plus-haut et du creux du drawdown maximal
+    running_peak = np.maximum.accumulate(equity)
+    trough = int(np.argmax(running_peak - equity))
+    return np.array([int(np.argmax(equity[:trough + 1])), trough])
+
+def downsample_minmax(y, n_buckets: int):
+    # Min et max de chaque intervalle : forme et extrêmes conservés, ~2 points par pixel
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    padded = np.pad(y, (0, size * n_buckets - n), mode='edge').reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.clip(idx, 0, n - 1))
+
+def downsample_lttb(y, n_out: int):
+    # Largest-Triangle-Three-Buckets (Steinarsson) ; x = rang du trade
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            avg_x, avg_y = x[end:edges[i + 2]].mean() if edges[i + 2] > end else x[end], \
+                y[end:edges[i + 2]].mean() if edges[i + 2] > end else y[end]
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return np.unique(selected)
+
+def equity_plot_indices(days, equity, mode: str, width_px: int):
+    # Indices des points à tracer ; le plus-haut et le creux du drawdown max sont toujours inclus
+    n = len(equity)
+    if mode == "Complet" or (mode == "Auto" and n <= 2 * width_px):
+        return np.arange(n)
+    if mode == "Journalier":
+        # Clôture de chaque jour, puis min/max si l'historique dépasse la largeur du graphique
+        idx = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        if len(idx) > 2 * width_px:
+            idx = idx[downsample_minmax(equity[idx], width_px)]
+    elif mode == "LTTB":
+        idx = downsample_lttb(equity, width_px)
+    else:
+        idx = downsample_minmax(equity, width_px)
+    return np.union1d(idx, drawdown_extremes(equity))
+
+# ============================================
+# DIMENSIONNEMENT DE POSITIONS (VECTORISÉ)
+# ============================================
+def size_positions(capital, entry, stop, target, risk_pct, point_value, lot_step, min_lot, max_lot):
+    # Tous les paramètres sont des scalaires ou des tableaux NumPy diffusables (broadcast) :
+    # une grille (n lignes, k niveaux de risque) est évaluée en une seule passe.
+    # Taille arrondie au pas inférieur (le risque réel ne dépasse jamais le risque cible),
+    # plafonnée à max_lot, et mise à 0 si elle tombe sous min_lot.
+    entry, stop, target, risk_pct, point_value, lot_step, min_lot, max_lot = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (entry, stop, target, risk_pct, point_value, lot_step, min_lot, max_lot)))
+    risk_amount = capital * risk_pct / 100
+    risk_distance = np.abs(entry - stop)
+    reward_distance = np.abs(target - entry)
+    valid = (entry > 0) & (stop > 0) & (target > 0) & (point_value > 0) & (risk_distance > 0)
+
+    risk_per_lot = risk_distance * point_value
+    raw_lots = np.divide(risk_amount, risk_per_lot, out=np.zeros_like(risk_amount), where=valid)
+    # + 1e-9 : 0.3 / 0.1 = 2.9999999999999996 ne doit pas donner 0.2 lot
+    lots = np.round(np.floor(raw_lots / lot_step + 1e-9) * lot_step, 8)
+    below_min = valid & (lots < min_lot)
+    capped = valid & (lots > max_lot)
+    lots = np.where(below_min, 0.0, np.minimum(lots, max_lot))
+
+    max_loss = risk_per_lot * lots
+    return {
+        'raw_lots': raw_lots,
+        'lots': lots,
+        'max_loss': max_loss,
+        'potential_gain': reward_distance * point_value * lots,
+        'risk_reward': np.divide(reward_distance, risk_distance, out=np.zeros_like(risk_distance), where=risk_distance > 0),
+        'risk_pct_real': max_loss / capital * 100 if capital > 0 else np.zeros_like(max_loss),
+        'valid': valid,
+        'below_min': below_min,
+        'capped': capped,
+    }
+
+def size_watchlist(capital, watchlist_df, risk_levels):
+    # Watchlist (une ligne par idée de trade) x niveaux de risque -> matrices (n, k)
+    config = [ASSET_CONFIG[pair] for pair in watchlist_df['pair']]
+    column = lambda key: np.array([asset[key] for asset in config], dtype=np.float64)[:, None]
+    return size_positions(
+        capital,
+        watchlist_df['entry'].to_numpy(dtype=np.float64)[:, None],
+        watchlist_df['stop'].to_numpy(dtype=np.float64)[:, None],
+        watchlist_df['target'].to_numpy(dtype=np.float64)[:, None],
+        np.asarray(risk_levels, dtype=np.float64)[None, :],
+        column('point_value'), column('lot_step'), column('min_lot'), column('max_lot'),
+    )
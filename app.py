@@ -1,12 +1,30 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, timedelta
-from supabase import create_client, Client
-import bcrypt
+from zoneinfo import ZoneInfo
 import os
+import tempfile
 import time
+import math
+import threading
+import json
+import logging
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import extra_streamlit_components as stx
+from storage import InstrumentedStorage, SupabaseStorage, SQLiteStorage
+import trade_import
+from analytics import (ASSET_CONFIG, TRADE_FRAME_COLUMNS, TRADING_SESSIONS, RiskMetrics, aggregates_version,
+                       calculate_kpis, equity_curve, equity_plot_indices, histogram_from_buckets,
+                       kpis_from_group_stats, merge_trades, portfolio_equity, result_histogram, size_positions,
+                       size_watchlist, time_buckets, trade_set_version)
+from charts import (FigureCache, assets_figure, calendar_figure, distribution_figure, equity_figure,
+                    monte_carlo_figure, monthly_figure, portfolio_figure, time_bucket_figure)
+from metrics import METRICS, profile_summary, start_metrics_server
+from simulation import FAN_PERCENTILES, DRAWDOWN_PERCENTILES, make_executor, run_monte_carlo, trades_fingerprint
+from auth import AuthBusyError, LoginRateLimiter, PasswordHasher, read_session_token, sign_session_token
 
 # ============================================
 # CONFIGURATION DE LA PAGE (EN PREMIER)
@@ -17,6 +35,8 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed"
 )
+# Profil de ce rerun : toutes les mesures du thread de session jusqu'au pied de page
+METRICS.start_profile()
 
 # ============================================
 # COOKIE MANAGER - UNE SEULE INITIALISATION GLOBALE
@@ -129,104 +149,801 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-ASSET_CONFIG = {
-    "XAUUSD": {"name": "Gold", "point_value": 100.0, "currency": "$"},
-    "DJ30": {"name": "Dow Jones 30", "point_value": 5.0, "currency": "$"},
-    "DAX40": {"name": "DAX 40", "point_value": 25.0, "currency": "€"},
-    "NAS100": {"name": "Nasdaq 100", "point_value": 20.0, "currency": "$"},
-    "BTCUSD": {"name": "Bitcoin", "point_value": 1.0, "currency": "$"},
-    "ETHUSD": {"name": "Ethereum", "point_value": 1.0, "currency": "$"}
-}
-
 # ============================================
-# CONNEXION SUPABASE
+# CONNEXION BASE DE DONNÉES
 # ============================================
+# "supabase" : base cloud (SUPABASE_URL / SUPABASE_KEY)
+# "sqlite" : base locale embarquée (TRADEFLOW_SQLITE_PATH), sans réseau
+STORAGE_BACKEND = os.getenv("TRADEFLOW_STORAGE", "supabase")
+
 @st.cache_resource
-def init_supabase():
+def init_storage():
     try:
+        # Chaque requête est chronométrée ("db.<méthode>")
+        if STORAGE_BACKEND == "sqlite":
+            return InstrumentedStorage(SQLiteStorage(os.getenv("TRADEFLOW_SQLITE_PATH", "tradeflow.db")), METRICS)
         supabase_url = os.getenv("SUPABASE_URL") or st.secrets["supabase"]["url"]
         supabase_key = os.getenv("SUPABASE_KEY") or st.secrets["supabase"]["key"]
-        return create_client(supabase_url, supabase_key)
+        return InstrumentedStorage(SupabaseStorage(supabase_url, supabase_key), METRICS)
     except Exception as e:
-        st.error(f"❌ Erreur Supabase: {str(e)}")
+        st.error(f"❌ Erreur base de données: {str(e)}")
         st.stop()
 
-supabase = init_supabase()
+storage = init_storage()
+
+# ============================================
+# MÉTRIQUES ET INSTRUMENTATION
+# ============================================
+# Port de l'endpoint Prometheus GET /metrics (désactivé si vide)
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Reruns plus lents journalisés en JSON (logger "tradeflow.metrics") ; 0 = jamais
+METRICS_SLOW_RERUN_MS = float(os.getenv("METRICS_SLOW_RERUN_MS", "2000"))
+metrics_logger = logging.getLogger("tradeflow.metrics")
+
+@st.cache_resource
+def get_metrics_server():
+    if not METRICS_PORT:
+        return None
+    try:
+        return start_metrics_server(METRICS, METRICS_PORT, METRICS_HOST)
+    except OSError as e:
+        # Port déjà pris (plusieurs process sur la même machine) : l'app continue sans endpoint
+        metrics_logger.warning(f"Endpoint Prometheus indisponible sur le port {METRICS_PORT}: {e}")
+        return None
+
+get_metrics_server()
+
+def render_chart(name: str, fig):
+    # Sérialisation de la figure et envoi au navigateur
+    with METRICS.timer(f"chart.{name}.render"):
+        st.plotly_chart(fig, width="stretch")
+
+# ============================================
+# CACHE DES FIGURES (JSON PLOTLY)
+# ============================================
+FIGURE_CACHE_MAX_ENTRIES = int(os.getenv("FIGURE_CACHE_MAX_ENTRIES", "512"))
+FIGURE_CACHE_MAX_MB = float(os.getenv("FIGURE_CACHE_MAX_MB", "64"))
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(FIGURE_CACHE_MAX_ENTRIES, int(FIGURE_CACHE_MAX_MB * 1024 * 1024))
+
+def cached_figure(name: str, key, build):
+    # key : (utilisateur, version du jeu de trades, paramètres d'affichage...) ;
+    # build() n'est appelé que si cette combinaison n'a jamais été construite
+    return get_figure_cache().get_or_build((name, *key), build)
 
 # ============================================
 # FONCTIONS AUTH
 # ============================================
+# Coût bcrypt (2^rounds itérations) des nouveaux hachages ; les anciens restent vérifiables
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# "thread" : pool de threads (bcrypt libère le GIL) ; "process" : process forkés depuis
+# le serveur multi-threadé, à réserver aux déploiements qui l'ont validé (repli sur
+# "thread" sans fork : Windows, macOS). Dans les deux cas la session attend son
+# hachage : le pool borne le CPU consommé par les connexions simultanées
+AUTH_POOL = os.getenv("AUTH_POOL", "thread")
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hachages en attente ou en cours au-delà desquels une connexion attend puis est refusée
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", str(AUTH_WORKERS * 8)))
+AUTH_QUEUE_TIMEOUT = float(os.getenv("AUTH_QUEUE_TIMEOUT", "10"))
+# Échecs de connexion tolérés par fenêtre glissante, par email et par adresse IP
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_MAX_ATTEMPTS_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_IP", "20"))
+# Comptes autorisés à voir les panneaux d'administration (métriques)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+@st.cache_resource
+def get_password_hasher():
+    return PasswordHasher(BCRYPT_ROUNDS, AUTH_WORKERS, AUTH_MAX_PENDING, AUTH_QUEUE_TIMEOUT, METRICS, AUTH_POOL)
+
+@st.cache_resource
+def get_login_limiter():
+    return LoginRateLimiter(LOGIN_WINDOW_SECONDS, {'email': LOGIN_MAX_ATTEMPTS, 'ip': LOGIN_MAX_ATTEMPTS_IP})
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return get_password_hasher().hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return get_password_hasher().verify(password, hashed)
+
+def is_admin():
+    return bool(st.session_state.user_email) and st.session_state.user_email.lower() in ADMIN_EMAILS
+
+def login_keys(email: str = None):
+    # Clés du limiteur de tentatives : email (si fourni) et adresse IP du client
+    keys = [f"email:{email.strip().lower()}"] if email else []
+    ip_address = st.context.ip_address
+    if ip_address:
+        keys.append(f"ip:{ip_address}")
+    return keys
 
 def authenticate_user(email: str, password: str):
-    try:
-        response = supabase.table('users').select("*").eq('email', email).execute()
-        if not response.data:
+    # Renvoie l'utilisateur ou None. AuthBusyError remonte : le pool bcrypt est saturé.
+    with METRICS.timer('login'):
+        try:
+            user = storage.get_user(email, "email,full_name,password_hash")
+            if user and verify_password(password, user['password_hash']):
+                METRICS.increment('login_success')
+                return user
+            METRICS.increment('login_failure')
             return None
-        user = response.data[0]
-        if verify_password(password, user['password_hash']):
-            return user
-        return None
-    except:
-        return None
+        except AuthBusyError:
+            raise
+        except:
+            return None
+
+# ============================================
+# SESSION PERSISTANTE (COOKIE SIGNÉ)
+# ============================================
+SESSION_COOKIE = "tradeflow_session"
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", "30"))
+# Âge du jeton au-delà duquel l'auto-login revérifie que le compte existe toujours,
+# puis renouvelle le jeton. En deçà, aucune requête : la signature suffit.
+SESSION_REVALIDATE_SECONDS = float(os.getenv("SESSION_REVALIDATE_SECONDS", "3600"))
+# Clé HMAC des jetons : en deçà, ou si c'est l'exemple de la documentation (public),
+# n'importe qui pourrait signer un jeton pour n'importe quel email
+SESSION_SECRET_MIN_BYTES = 32
+SESSION_SECRET_PLACEHOLDERS = {"COLLEZ-ICI-LE-SECRET-GENERE", "REMPLACEZ-PAR-UNE-LONGUE-CHAINE-ALEATOIRE",
+                               "LONGUE-CHAINE-ALEATOIRE"}
+auth_logger = logging.getLogger("tradeflow.auth")
+
+@st.cache_resource
+def get_session_secret():
+    secret = os.getenv("TRADEFLOW_SESSION_SECRET")
+    if not secret:
+        try:
+            secret = st.secrets["session"]["secret"]
+        except Exception:
+            secret = None
+    if secret and (secret.strip() in SESSION_SECRET_PLACEHOLDERS
+                   or len(secret.encode('utf-8')) < SESSION_SECRET_MIN_BYTES):
+        auth_logger.error("Secret de session refusé (exemple de la documentation ou moins de "
+                          f"{SESSION_SECRET_MIN_BYTES} octets) : secret éphémère utilisé. Générez-en un avec "
+                          "python -c \"import secrets; print(secrets.token_urlsafe(48))\"")
+        secret = None
+    if not secret:
+        # Secret éphémère : les sessions "se souvenir de moi" ne survivent pas à un redémarrage
+        secret = secrets.token_urlsafe(48)
+    return secret.encode('utf-8')
+
+@st.cache_data(ttl=300, max_entries=4096, show_spinner=False)
+def fetch_session_user(email: str):
+    # Revalidation partagée entre sessions : colonnes utiles seulement, jamais password_hash
+    return storage.get_user(email, "email,full_name")
+
+def issue_session_token(email: str, full_name: str = None):
+    return sign_session_token(get_session_secret(), email, full_name, SESSION_TTL_DAYS * 86400)
 
 def create_user(email: str, password: str, full_name: str = None):
     try:
         password_hash = hash_password(password)
         data = {"email": email, "password_hash": password_hash, "full_name": full_name}
-        supabase.table('users').insert(data).execute()
+        storage.create_user(data)
         return True
     except Exception as e:
         st.error(f"❌ Erreur: {str(e)}")
         return False
 
+# ============================================
+# CACHE DES TRADES (PAR UTILISATEUR)
+# ============================================
+TRADES_CACHE_TTL = float(os.getenv("TRADES_CACHE_TTL", "300"))
+TRADES_CACHE_MAX_USERS = int(os.getenv("TRADES_CACHE_MAX_USERS", "256"))
+# "incremental" : ne télécharge que les trades plus récents que le dernier id vu
+# "full" : recharge tout l'historique à l'expiration du TTL
+TRADES_SYNC_MODE = os.getenv("TRADES_SYNC_MODE", "incremental")
+# Supabase limite chaque réponse à 1000 lignes (max-rows PostgREST)
+TRADES_SYNC_PAGE = 1000
+# Taille des paquets d'ids pour les DELETE de repli (longueur d'URL raisonnable)
+TRADES_DELETE_CHUNK = 500
+
+class TradesCache:
+    # Cache LRU + TTL partagé entre les sessions du process.
+    # Chaque entrée garde le DataFrame et le plus grand id synchronisé (high-water mark).
+    # Les DataFrames stockés sont partagés : ne jamais les modifier en place.
+    def __init__(self, ttl: float, max_users: int):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        # Compteur d'écritures par utilisateur (jamais évincé : un entier par utilisateur),
+        # sert de clé de version aux caches dérivés (agrégats serveur, ...)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_email):
+        with self._lock:
+            return self._versions.get(user_email, 0)
+
+    def _bump(self, user_email):
+        self._versions[user_email] = self._versions.get(user_email, 0) + 1
+
+    def lookup(self, user_email):
+        # Retourne l'entrée même expirée (base de la synchro incrémentale) ou None
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return None
+            self._entries.move_to_end(user_email)
+            return {'df': entry['df'], 'last_id': entry['last_id'],
+                    'fresh': time.monotonic() - entry['synced_at'] <= self.ttl}
+
+    def get(self, user_email):
+        entry = self.lookup(user_email)
+        if entry is None or not entry['fresh']:
+            return None
+        return entry['df']
+
+    def put(self, user_email, df, last_id: int = 0, base_df=None, added_rows=None, expected_version=None):
+        # base_df/added_rows : DataFrame de départ d'une synchro incrémentale et lignes
+        # réellement nouvelles, pour prolonger les métriques de risque sans backfill.
+        # expected_version : version lue avant la synchro (compare-and-swap) ; si une écriture
+        # (append / replace / invalidate) est passée entre-temps, df est périmé et n'est pas
+        # stocké. Renvoie True si l'entrée a été remplacée.
+        with self._lock:
+            if expected_version is not None and self._versions.get(user_email, 0) != expected_version:
+                return False
+            new_entry = {'df': df, 'last_id': last_id, 'synced_at': time.monotonic()}
+            old_entry = self._entries.get(user_email)
+            if old_entry is not None and base_df is not None:
+                new_entry['risk'] = old_entry.get('risk') if old_entry['df'] is base_df else None
+                new_entry['risk_df'] = old_entry.get('risk_df')
+                self._carry_risk(new_entry, base_df, df, added_rows)
+            self._entries[user_email] = new_entry
+            self._bump(user_email)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return True
+
+    def append(self, user_email, rows):
+        # Write-through : on patche l'entrée existante au lieu de tout recharger.
+        # last_id n'avance pas : la prochaine synchro reverra ces lignes (dédoublonnées)
+        # et ne sautera pas un trade inséré entre-temps depuis un autre appareil.
+        with self._lock:
+            if not rows:
+                return
+            self._bump(user_email)
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return
+            new_df = merge_trades(entry['df'], rows)
+            self._carry_risk(entry, entry['df'], new_df, rows)
+            entry['df'] = new_df
+
+    def _carry_risk(self, entry, base_df, new_df, added_rows):
+        # Mise à jour O(1) par trade des métriques de risque si elles ont été calculées
+        # sur base_df et que les lignes ajoutées sont chronologiquement postérieures.
+        risk = entry.get('risk')
+        entry['risk'] = None
+        if risk is None or entry.get('risk_df') is not base_df or added_rows is None:
+            return
+        if len(added_rows) > RISK_INCREMENTAL_MAX_ROWS:
+            return
+        added = pd.DataFrame(added_rows)
+        risk = risk.extended(pd.to_datetime(added['date']).to_numpy().astype('datetime64[D]'),
+                             added['result'].to_numpy(dtype=np.float64)) if not added.empty else risk
+        if risk is not None:
+            entry['risk'] = risk
+            entry['risk_df'] = new_df
+
+    def get_risk(self, user_email, trades_df):
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry.get('risk_df') is trades_df and entry.get('risk') is not None:
+                return entry['risk']
+        risk = RiskMetrics.from_trades(trades_df)
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry['df'] is trades_df:
+                entry['risk'] = risk
+                entry['risk_df'] = trades_df
+        return risk
+
+    def remove(self, user_email, trade_ids):
+        # Retire des lignes (rollback d'une écriture optimiste)
+        self.replace(user_email, trade_ids, [])
+
+    def replace(self, user_email, trade_ids, rows):
+        # Remplace des lignes (ids temporaires -> lignes confirmées par la base).
+        # Sans entrée, rien à patcher : le bump de version suffit à rejeter un put()
+        # construit avant l'écriture, la prochaine lecture rechargera depuis la base.
+        with self._lock:
+            self._bump(user_email)
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return
+            df = entry['df']
+            kept = df[~df['id'].isin(trade_ids)].reset_index(drop=True) if not df.empty else df
+            entry['df'] = merge_trades(kept, rows)
+            entry['risk'] = None
+
+    def get_kpis(self, user_email, trades_df):
+        # Mémoïsation sur l'identité du DataFrame : toute synchro/patch crée un nouvel objet
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry.get('kpis_df') is trades_df:
+                return entry['kpis']
+        kpis = calculate_kpis(trades_df)
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry['df'] is trades_df:
+                entry['kpis'] = kpis
+                entry['kpis_df'] = trades_df
+        return kpis
+
+    def get_trade_set_version(self, user_email, trades_df):
+        # Version de contenu du jeu de trades (clé du cache de figures), mémoïsée comme les KPIs
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry.get('trade_set_df') is trades_df:
+                return entry['trade_set_version']
+        version = trade_set_version(trades_df)
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry['df'] is trades_df:
+                entry['trade_set_version'] = version
+                entry['trade_set_df'] = trades_df
+        return version
+
+    def invalidate(self, user_email):
+        with self._lock:
+            self._entries.pop(user_email, None)
+            self._bump(user_email)
+
+@st.cache_resource
+def get_trades_cache():
+    return TradesCache(TRADES_CACHE_TTL, TRADES_CACHE_MAX_USERS)
+
+# ============================================
+# COMPTES BROKER (PLUSIEURS PAR UTILISATEUR)
+# ============================================
+# Compte créé à la première visite ; il reçoit l'historique sans compte
+DEFAULT_ACCOUNT_NAME = "Compte principal"
+DEFAULT_CAPITAL_REEL = 733.18
+DEFAULT_CREDIT_BROKER = 500.0
+# Comptes chargés en parallèle au premier chargement d'un portefeuille (une pagination par compte)
+ACCOUNT_LOAD_WORKERS = int(os.getenv("ACCOUNT_LOAD_WORKERS", "8"))
+
+@st.cache_resource
+def get_account_executor():
+    return ThreadPoolExecutor(max_workers=ACCOUNT_LOAD_WORKERS, thread_name_prefix="tradeflow-accounts")
+
+@st.cache_data(ttl=TRADES_CACHE_TTL, max_entries=TRADES_CACHE_MAX_USERS, show_spinner=False)
+def fetch_user_accounts(user_email):
+    return storage.list_accounts(user_email)
+
+def get_user_accounts(user_email):
+    # Comptes de l'utilisateur triés par id. Base injoignable : un compte local non
+    # persisté (id 0, celui des trades sans compte) pour que l'app reste utilisable.
+    try:
+        accounts = fetch_user_accounts(user_email)
+        if accounts:
+            return accounts
+        try:
+            account = storage.create_account({'user_email': user_email, 'name': DEFAULT_ACCOUNT_NAME,
+                                              'capital_reel': DEFAULT_CAPITAL_REEL,
+                                              'credit_broker': DEFAULT_CREDIT_BROKER})
+            if storage.claim_unassigned_trades(user_email, account['id']):
+                get_trades_cache().invalidate(user_email)
+        except:
+            pass  # créé entre-temps par une autre session (nom unique par utilisateur)
+        fetch_user_accounts.clear(user_email)
+        return fetch_user_accounts(user_email)
+    except:
+        return [st.session_state.setdefault('offline_account', {
+            'id': 0, 'user_email': user_email, 'name': DEFAULT_ACCOUNT_NAME,
+            'capital_reel': DEFAULT_CAPITAL_REEL, 'credit_broker': DEFAULT_CREDIT_BROKER})]
+
+def create_account(user_email, name: str, capital_reel: float, credit_broker: float):
+    try:
+        account = storage.create_account({'user_email': user_email, 'name': name,
+                                          'capital_reel': capital_reel, 'credit_broker': credit_broker})
+        fetch_user_accounts.clear(user_email)
+        return account
+    except Exception as e:
+        st.error(f"❌ Erreur: {str(e)}")
+        return None
+
+def save_account_capital(account_id: int, field: str, widget_key: str):
+    # on_change des champs de capital : persisté avant le rerun, visible par tous les onglets
+    value = float(st.session_state[widget_key])
+    if account_id == 0:
+        st.session_state.offline_account[field] = value
+        return
+    try:
+        storage.update_account(account_id, {field: value})
+        fetch_user_accounts.clear(st.session_state.user_email)
+    except Exception as e:
+        st.error(f"❌ Capital non sauvegardé : {str(e)}")
+
+@st.cache_data(ttl=TRADES_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_portfolio(version: str, capitals, _trades_df):
+    # Alignement recalculé seulement si le jeu de trades (version) ou un capital change
+    return portfolio_equity(_trades_df, dict(capitals))
+
+def fetch_accounts_trades(user_email, account_ids, columns: str):
+    # Une pagination keyset par compte, toutes en parallèle : le chargement d'un portefeuille
+    # dure autant que celui de son plus gros compte, et non la somme des comptes
+    def fetch_account(account_id):
+        return [row for page in storage.iter_trade_pages(user_email, 0, columns, TRADES_SYNC_PAGE, account_id)
+                for row in page]
+    return [row for rows in get_account_executor().map(fetch_account, account_ids) for row in rows]
+
 # ============================================
 # FONCTIONS TRADES
 # ============================================
+def iter_trade_pages(user_email, last_id: int = 0, columns: str = "*"):
+    # Pagination keyset sur id (id > last_id) page par page jusqu'à épuisement
+    return storage.iter_trade_pages(user_email, last_id, columns, TRADES_SYNC_PAGE)
+
+def fetch_trades_after(user_email, last_id: int, columns: str = "*"):
+    return [row for page in iter_trade_pages(user_email, last_id, columns) for row in page]
+
+def sync_user_trades(user_email, trades_df, last_id: int, account_ids=()):
+    # Renvoie (DataFrame, last_id, lignes ajoutées) ; lignes ajoutées = None si la
+    # synchro a dû réconcilier des suppressions (les métriques de risque sont alors recalculées)
+    full_load = last_id == 0
+    # 1) Lignes plus récentes que le high-water mark ; premier chargement de plusieurs
+    #    comptes : un flux par compte en parallèle
+    per_account = full_load and len(account_ids) > 1
+    if per_account:
+        new_rows = fetch_accounts_trades(user_email, account_ids, ",".join(TRADE_FRAME_COLUMNS))
+    else:
+        new_rows = fetch_trades_after(user_email, last_id, columns=",".join(TRADE_FRAME_COLUMNS))
+    known_ids = set(trades_df['id']) if not trades_df.empty else set()
+    added_rows = [row for row in new_rows if row['id'] not in known_ids]
+    trades_df = merge_trades(trades_df, new_rows)
+    if new_rows:
+        last_id = max(last_id, max(row['id'] for row in new_rows))
+
+    # 2) Suppressions : un simple COUNT (en-tête HTTP seulement), puis la liste
+    #    des ids uniquement si le compte local diverge. Après un chargement par compte,
+    #    le même COUNT rattrape les trades sans compte.
+    if not full_load or per_account:
+        server_count = storage.count_trades(user_email)
+        if server_count is not None and server_count != len(trades_df):
+            added_rows = None
+            server_ids = {row['id'] for row in fetch_trades_after(user_email, 0, columns="id")}
+            trades_df = trades_df[trades_df['id'].isin(server_ids)].reset_index(drop=True) if not trades_df.empty else trades_df
+            missing_ids = sorted(server_ids - set(trades_df['id'] if not trades_df.empty else []))
+            for i in range(0, len(missing_ids), TRADES_SYNC_PAGE):
+                chunk = missing_ids[i:i + TRADES_SYNC_PAGE]
+                trades_df = merge_trades(trades_df, storage.fetch_trades_by_ids(chunk, ",".join(TRADE_FRAME_COLUMNS)))
+
+    return trades_df, last_id, added_rows
+
+@METRICS.timed('trades.load')
 def get_user_trades(user_email):
+    cache = get_trades_cache()
+    # Version lue avant l'entrée : une écriture concurrente pendant la synchro fait échouer le put()
+    version = cache.version(user_email)
+    entry = cache.lookup(user_email)
+    if entry is not None and entry['fresh']:
+        return entry['df']
     try:
-        response = supabase.table('trades').select("*").eq('user_email', user_email).order('date', desc=True).execute()
-        if response.data:
-            return pd.DataFrame(response.data)
-        return pd.DataFrame()
+        if entry is not None and TRADES_SYNC_MODE == "incremental":
+            trades_df, last_id, added_rows = sync_user_trades(user_email, entry['df'], entry['last_id'])
+            cache.put(user_email, trades_df, last_id, base_df=entry['df'], added_rows=added_rows,
+                      expected_version=version)
+        else:
+            account_ids = [account['id'] for account in get_user_accounts(user_email) if account['id']]
+            trades_df, last_id, _ = sync_user_trades(user_email, pd.DataFrame(), 0, account_ids)
+            cache.put(user_email, trades_df, last_id, expected_version=version)
+        return trades_df
     except:
-        return pd.DataFrame()
+        return entry['df'] if entry is not None else pd.DataFrame()
 
-def delete_user_trades(user_email):
+def delete_user_trades(user_email, progress=None):
+    # Un seul DELETE filtré sur user_email : une requête, une transaction.
+    # Si la requête échoue (timeout sur un très gros journal), repli sur des DELETE
+    # par paquets d'ids. Renvoie le nombre de trades supprimés, ou None.
+    cache = get_trades_cache()
     try:
-        response = supabase.table('trades').select("id").eq('user_email', user_email).execute()
-        if response.data:
-            for trade in response.data:
-                supabase.table('trades').delete().eq('id', trade['id']).execute()
-        return True
+        deleted = storage.delete_user_trades(user_email)
+        cache.put(user_email, pd.DataFrame())
+        if progress:
+            progress(1.0)
+        return deleted
     except:
-        return False
+        pass
+
+    deleted = 0
+    try:
+        trade_ids = [row['id'] for row in fetch_trades_after(user_email, 0, columns="id")]
+        for i in range(0, len(trade_ids), TRADES_DELETE_CHUNK):
+            chunk = trade_ids[i:i + TRADES_DELETE_CHUNK]
+            storage.delete_trades(chunk)
+            deleted += len(chunk)
+            if progress:
+                progress(deleted / len(trade_ids))
+        cache.put(user_email, pd.DataFrame())
+        return deleted
+    except:
+        cache.invalidate(user_email)
+        return None
+
+# ============================================
+# JOURNAL PAGINÉ (KEYSET SUR DATE, ID)
+# ============================================
+JOURNAL_COLUMNS = "id,date,pair,direction,entry_price,exit_price,lots,result"
+JOURNAL_PAGE_SIZES = [50, 100, 250]
+
+@METRICS.timed('journal.page')
+@st.cache_data(ttl=TRADES_CACHE_TTL, max_entries=512, show_spinner=False)
+def fetch_journal_page(user_email, version: int, date_from, date_to, pairs, directions, cursor, page_size: int):
+    # Une page triée (date, id) décroissants, filtrée côté serveur. cursor = (date, id) de la
+    # dernière ligne de la page précédente : le coût ne dépend pas du numéro de page.
+    # version : compteur d'écritures du cache des trades (invalide les pages après un insert/delete)
+    rows = storage.fetch_journal_page(user_email, JOURNAL_COLUMNS, date_from, date_to, pairs, directions,
+                                      cursor, page_size + 1)
+    return pd.DataFrame(rows[:page_size]), len(rows) > page_size
+
+def journal_next_page(cursor):
+    st.session_state.journal_cursors.append(cursor)
+
+def journal_previous_page():
+    if len(st.session_state.journal_cursors) > 1:
+        st.session_state.journal_cursors.pop()
+
+# ============================================
+# EXPORT EN STREAMING (CSV / PARQUET)
+# ============================================
+EXPORT_COLUMNS = ['id', 'date', 'pair', 'direction', 'entry_price', 'exit_price', 'lots', 'result', 'timestamp']
+# Format -> (extension, type MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+# Lignes accumulées par row group Parquet (mémoire bornée)
+EXPORT_ROW_GROUP = 50_000
+
+def _export_arrow_table(rows):
+    import pyarrow as pa
+    df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+    return pa.table({
+        'id': pa.array(df['id'], type=pa.int64()),
+        'date': pa.array(pd.to_datetime(df['date']).dt.date, type=pa.date32()),
+        'pair': pa.array(df['pair'], type=pa.string()),
+        'direction': pa.array(df['direction'], type=pa.string()),
+        'entry_price': pa.array(df['entry_price'], type=pa.float64()),
+        'exit_price': pa.array(df['exit_price'], type=pa.float64()),
+        'lots': pa.array(df['lots'], type=pa.float64()),
+        'result': pa.array(df['result'], type=pa.float64()),
+        'timestamp': pa.array(pd.to_datetime(df['timestamp'], utc=True, format='ISO8601'), type=pa.timestamp('us', tz='UTC')),
+    })
+
+def export_trades(user_email, export_format: str):
+    # Appelé uniquement au clic sur le bouton (données différées de st.download_button).
+    # Les pages lues en base sont écrites au fil de l'eau dans un fichier temporaire :
+    # pendant la génération, la mémoire reste bornée à une page (CSV) ou un row group
+    # (Parquet). Renvoie les octets du fichier (Streamlit refuse un BufferedRandom).
+    out = tempfile.TemporaryFile()
+    pages = iter_trade_pages(user_email, columns=",".join(EXPORT_COLUMNS))
+
+    if export_format == "Parquet":
+        import pyarrow.parquet as pq
+        writer = None
+        buffer = []
+        for page in pages:
+            buffer.extend(page)
+            if len(buffer) >= EXPORT_ROW_GROUP:
+                table = _export_arrow_table(buffer)
+                writer = writer or pq.ParquetWriter(out, table.schema, compression='zstd')
+                writer.write_table(table)
+                buffer = []
+        if buffer or writer is None:
+            table = _export_arrow_table(buffer)
+            writer = writer or pq.ParquetWriter(out, table.schema, compression='zstd')
+            writer.write_table(table)
+        writer.close()
+    else:
+        header = True
+        for page in pages:
+            pd.DataFrame(page, columns=EXPORT_COLUMNS).to_csv(out, header=header, index=False, encoding='utf-8')
+            header = False
+        if header:
+            pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(out, index=False, encoding='utf-8')
+
+    out.seek(0)
+    with out:
+        return out.read()
+
+# ============================================
+# ÉCRITURES ASYNCHRONES (INSERTION OPTIMISTE)
+# ============================================
+TRADE_WRITE_WORKERS = int(os.getenv("TRADE_WRITE_WORKERS", "4"))
+TRADE_WRITE_POLL_SECONDS = 0.5
+
+@st.cache_resource
+def get_write_executor():
+    return ThreadPoolExecutor(max_workers=TRADE_WRITE_WORKERS, thread_name_prefix="tradeflow-write")
+
+def _write_trades(cache, user_email, rows, temp_ids):
+    # Exécuté dans le pool : confirme (ids réels) ou annule l'insertion optimiste dans le cache
+    # partagé, même si la session qui a soumis les trades s'est fermée entre-temps.
+    try:
+        inserted = storage.insert_trades(rows)
+    except Exception:
+        cache.remove(user_email, temp_ids)
+        raise
+    cache.replace(user_email, temp_ids, inserted)
+    return len(inserted)
+
+def flush_trade_queue():
+    # Une seule écriture en vol par session ; les trades saisis entre-temps
+    # partent ensemble dans un seul INSERT au prochain flush
+    if st.session_state.get('trade_write') is not None or not st.session_state.get('trade_queue'):
+        return
+    queue = st.session_state.trade_queue
+    st.session_state.trade_queue = []
+    rows = [row for row, _ in queue]
+    temp_ids = [temp_id for _, temp_id in queue]
+    future = get_write_executor().submit(_write_trades, get_trades_cache(), st.session_state.user_email, rows, temp_ids)
+    st.session_state.trade_write = (future, len(rows))
+
+def queue_trade(row):
+    # Insertion optimiste : le trade apparaît immédiatement (id temporaire négatif)
+    temp_id = -time.time_ns()
+    get_trades_cache().append(st.session_state.user_email, [dict(row, id=temp_id)])
+    st.session_state.setdefault('trade_queue', []).append((row, temp_id))
+    flush_trade_queue()
+
+def _trade_write_status():
+    write = st.session_state.get('trade_write')
+    if write is not None and write[0].done():
+        future, count = write
+        st.session_state.trade_write = None
+        try:
+            future.result()
+            st.session_state.trade_write_flash = ("success", f"✅ {count} trade(s) sauvegardé(s) !")
+        except Exception as e:
+            st.session_state.trade_write_flash = ("error", f"❌ Trade(s) non sauvegardé(s), annulé(s) : {str(e)}")
+        flush_trade_queue()
+        if st.session_state.get('trade_write') is None:
+            st.rerun(scope="app")
+    pending = (st.session_state.trade_write[1] if st.session_state.get('trade_write') else 0) \
+        + len(st.session_state.get('trade_queue', []))
+    st.caption(f"⏳ Enregistrement de {pending} trade(s)...")
+
+def render_trade_writes():
+    flash = st.session_state.pop('trade_write_flash', None)
+    if flash:
+        getattr(st, flash[0])(flash[1])
+    if st.session_state.get('trade_write') is not None or st.session_state.get('trade_queue'):
+        st.fragment(run_every=TRADE_WRITE_POLL_SECONDS)(_trade_write_status)()
 
-def calculate_kpis(trades_df):
+# ============================================
+# IMPORT DE TRADES (CSV / MT4 / MT5)
+# ============================================
+TRADES_IMPORT_BATCH = 500
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def parse_trades_file(data: bytes, filename: str):
+    # Renvoie (DataFrame normalisé prêt à insérer, {raison de rejet: nombre}) ; cf. trade_import.py
+    return trade_import.parse_trades_file(data, filename)
+
+def import_trades(user_email, trades, progress=None, account_id: int = None):
+    # Dédoublonne (fichier + trades existants du compte) puis insère par paquets.
+    # Renvoie (nombre inséré, nombre de doublons ignorés).
+    existing_df = get_user_trades(user_email)
+    if not existing_df.empty:
+        existing_df = existing_df[existing_df['account_id'] == (account_id or 0)]
+    duplicate = trade_import.duplicate_mask(trades, existing_df)
+    rows = trades[~duplicate].assign(user_email=user_email, account_id=account_id).to_dict('records')
+
+    cache = get_trades_cache()
+    inserted = 0
+    for i in range(0, len(rows), TRADES_IMPORT_BATCH):
+        batch = storage.insert_trades(rows[i:i + TRADES_IMPORT_BATCH])
+        cache.append(user_email, batch)
+        inserted += len(batch)
+        if progress:
+            progress(inserted / len(rows))
+    return inserted, int(duplicate.sum())
+
+@METRICS.timed('kpis')
+def get_user_kpis(user_email, trades_df):
+    # KPIs calculés une fois par version du jeu de trades, partagés par tous les onglets
+    return get_trades_cache().get_kpis(user_email, trades_df)
+
+# ============================================
+# AGRÉGATS ANALYTICS (VUES SQL / CALCUL LOCAL)
+# ============================================
+# "client" : agrégats calculés localement depuis les trades en cache
+# "server" : vues et RPC de create_analytics_views.sql (réponses de taille constante)
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "client")
+HISTOGRAM_BINS = 20
+
+@st.cache_data(ttl=TRADES_CACHE_TTL, max_entries=TRADES_CACHE_MAX_USERS, show_spinner=False)
+def fetch_server_analytics(user_email, version: int):
+    # version : compteur d'écritures du cache des trades, invalide le résultat après un insert/delete
+    # de ce process (les écritures d'ailleurs sont vues à l'expiration du TTL)
+    rows = storage.fetch_group_stats(user_email)
+    if not rows:
+        return None
+    buckets = storage.fetch_result_histogram(user_email, HISTOGRAM_BINS)
+    return {'kpis': kpis_from_group_stats(rows), 'histogram': histogram_from_buckets(buckets, HISTOGRAM_BINS),
+            'version': f"s{aggregates_version(rows, buckets)}"}
+
+@METRICS.timed('analytics')
+def get_user_analytics(user_email):
+    # Renvoie {'kpis', 'histogram', 'version'} ou None si l'utilisateur n'a aucun trade.
+    # version : clé des figures dérivées, empreinte du contenu (agrégats serveur ou trades)
+    if ANALYTICS_SOURCE == "server":
+        try:
+            return fetch_server_analytics(user_email, get_trades_cache().version(user_email))
+        except:
+            pass  # vues absentes ou erreur réseau : repli sur le calcul local
+    trades_df = get_user_trades(user_email)
     if trades_df.empty:
-        return {'winrate': 0, 'profit_factor': 0, 'biggest_win': 0, 'biggest_loss': 0,
-                'total_trades': 0, 'avg_win': 0, 'avg_loss': 0}
-
-    winning_trades = trades_df[trades_df['result'] > 0]
-    losing_trades = trades_df[trades_df['result'] < 0]
-    total_wins = winning_trades['result'].sum() if not winning_trades.empty else 0
-    total_losses = abs(losing_trades['result'].sum()) if not losing_trades.empty else 0
-    winrate = (len(winning_trades) / len(trades_df)) * 100 if len(trades_df) > 0 else 0
-    profit_factor = total_wins / total_losses if total_losses > 0 else (total_wins if total_wins > 0 else 0)
-
-    return {
-        'winrate': winrate,
-        'profit_factor': profit_factor,
-        'biggest_win': trades_df['result'].max() if not trades_df.empty else 0,
-        'biggest_loss': trades_df['result'].min() if not trades_df.empty else 0,
-        'total_trades': len(trades_df),
-        'avg_win': winning_trades['result'].mean() if not winning_trades.empty else 0,
-        'avg_loss': losing_trades['result'].mean() if not losing_trades.empty else 0
-    }
+        return None
+    return {'kpis': get_user_kpis(user_email, trades_df),
+            'histogram': result_histogram(trades_df['result'].to_numpy(dtype=np.float64), HISTOGRAM_BINS),
+            'version': get_trades_cache().get_trade_set_version(user_email, trades_df)}
+
+@st.cache_data(ttl=TRADES_CACHE_TTL, max_entries=TRADES_CACHE_MAX_USERS, show_spinner=False)
+def fetch_time_analytics(user_email, version: int):
+    # Rollup (jour, heure UTC) tenu à jour par triggers (migration 006) : quelques milliers
+    # de lignes quelle que soit la taille de l'historique ; version comme fetch_server_analytics
+    return time_buckets(storage.fetch_time_rollup(user_email))
+
+@METRICS.timed('analytics.time')
+def get_user_time_analytics(user_email):
+    # Renvoie time_buckets(...) ou None (aucun trade, ou table de rollup absente)
+    try:
+        return fetch_time_analytics(user_email, get_trades_cache().version(user_email))
+    except:
+        return None
+
+# ============================================
+# MÉTRIQUES DE RISQUE (DRAWDOWN, SHARPE, STREAKS)
+# ============================================
+# Au-delà, un backfill vectorisé est plus rapide que la mise à jour trade par trade
+RISK_INCREMENTAL_MAX_ROWS = 1000
+
+@METRICS.timed('risk')
+def get_user_risk(user_email, trades_df):
+    return get_trades_cache().get_risk(user_email, trades_df)
+
+# ============================================
+# DOWNSAMPLING DE LA COURBE D'EQUITY
+# ============================================
+# Largeur de référence du graphique : au-delà de ~2 points par pixel, le navigateur
+# reçoit des données invisibles
+EQUITY_CHART_WIDTH_PX = int(os.getenv("EQUITY_CHART_WIDTH_PX", "1200"))
+EQUITY_WEBGL_THRESHOLD = 5000
+EQUITY_MARKERS_MAX_POINTS = 500
+EQUITY_RENDER_MODES = ["Auto", "Min/Max", "LTTB", "Journalier", "Complet"]
+
+# ============================================
+# MONTE CARLO (RISQUE DE RUINE)
+# ============================================
+MONTE_CARLO_WORKERS = int(os.getenv("MONTE_CARLO_WORKERS", str(min(4, os.cpu_count() or 1))))
+# "thread" : pool de threads (NumPy libère le GIL) ; "process" : process forkés (ignoré sans fork)
+MONTE_CARLO_POOL = os.getenv("MONTE_CARLO_POOL", "thread")
+MONTE_CARLO_PATHS = [1_000, 10_000, 50_000, 100_000]
+MONTE_CARLO_MODES = {"€ (résultats historiques)": "eur", "R (risque fixe par trade)": "r"}
+
+@st.cache_resource
+def get_simulation_executor():
+    return make_executor(MONTE_CARLO_WORKERS, MONTE_CARLO_POOL) if MONTE_CARLO_WORKERS > 1 else None
+
+@METRICS.timed('monte_carlo')
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def cached_monte_carlo(fingerprint: str, _results, n_paths: int, horizon: int, start_capital: float,
+                       mode: str, risk_pct: float, ruin_pct: float):
+    # fingerprint : empreinte du jeu de trades, seule clé de cache (_results n'est pas haché)
+    return run_monte_carlo(_results, n_paths, horizon, start_capital, mode, risk_pct, ruin_pct,
+                           executor=get_simulation_executor(), workers=MONTE_CARLO_WORKERS)
+
+# ============================================
+# DIMENSIONNEMENT DE POSITIONS (VECTORISÉ)
+# ============================================
+WATCHLIST_COLUMNS = ['pair', 'entry', 'stop', 'target']
+WATCHLIST_RISK_LEVELS = [0.5, 1.0, 1.5, 2.0, 3.0, 5.0]
 
 # ============================================
 # SESSION STATE
@@ -237,25 +954,30 @@ if 'user_email' not in st.session_state:
     st.session_state.user_email = None
 if 'user_name' not in st.session_state:
     st.session_state.user_name = None
-if 'capital_reel' not in st.session_state:
-    st.session_state.capital_reel = 733.18
-if 'credit_broker' not in st.session_state:
-    st.session_state.credit_broker = 500.0
 
 # ============================================
 # VÉRIFICATION AU DÉMARRAGE - AUTO-LOGIN
 # ============================================
-saved_email = cookie_manager.get("user_email")
-if saved_email and not st.session_state.authenticated:
-    try:
-        response = supabase.table('users').select("*").eq('email', saved_email).execute()
-        if response.data:
-            user = response.data[0]
-            st.session_state.authenticated = True
-            st.session_state.user_email = user['email']
-            st.session_state.user_name = user.get('full_name', user['email'].split('@')[0])
-    except:
-        pass
+# Ancien cookie (email en clair, non signé) : plus jamais lu, supprimé au passage
+if cookie_manager.get("user_email"):
+    cookie_manager.delete("user_email", key="delete_legacy_cookie")
+
+if not st.session_state.authenticated:
+    session = read_session_token(get_session_secret(), cookie_manager.get(SESSION_COOKIE) or "")
+    if session and time.time() - session['iat'] > SESSION_REVALIDATE_SECONDS:
+        try:
+            user = fetch_session_user(session['email'])
+            if user:
+                session['name'] = user.get('full_name')
+                st.session_state.pending_cookie = issue_session_token(user['email'], user.get('full_name'))
+            else:
+                session = None  # compte supprimé
+        except:
+            pass  # base injoignable : la signature reste valide jusqu'à la prochaine revalidation
+    if session:
+        st.session_state.authenticated = True
+        st.session_state.user_email = session['email']
+        st.session_state.user_name = session['name'] or session['email'].split('@')[0]
 
 # ============================================
 # PAGE DE LOGIN
@@ -285,24 +1007,35 @@ if not st.session_state.authenticated:
             submit = st.form_submit_button("Se connecter", use_container_width=True)
 
             if submit and email and password:
-                user = authenticate_user(email, password)
+                limiter = get_login_limiter()
+                keys = login_keys(email)
+                retry_after = limiter.retry_after(keys)
+                user = None
+                if retry_after > 0:
+                    st.error(f"⛔ Trop de tentatives. Réessayez dans {math.ceil(retry_after)} s.")
+                else:
+                    try:
+                        user = authenticate_user(email, password)
+                        if user:
+                            limiter.reset(keys[0])
+                        else:
+                            limiter.record_failure(keys)
+                            st.error("❌ Email ou mot de passe incorrect")
+                    except AuthBusyError:
+                        st.error("⏳ Trop de connexions simultanées. Réessayez dans quelques secondes.")
                 if user:
-                    # 1. Écrire UN SEUL cookie avec l'email (si remember)
-                    if remember:
-                        cookie_manager.set("user_email", user['email'], expires_at=datetime.now() + timedelta(days=30))
-
-                    # 2. Forcer session_state
+                    # 1. Forcer session_state
                     st.session_state.authenticated = True
                     st.session_state.user_email = user['email']
                     st.session_state.user_name = user.get('full_name', email.split('@')[0])
 
-                    # 3. Attendre que le cookie s'écrive
-                    time.sleep(0.5)
+                    # 2. Le cookie (si remember) est écrit au prochain run, qui n'est pas
+                    #    interrompu par un rerun : plus besoin d'attendre le navigateur
+                    if remember:
+                        st.session_state.pending_cookie = issue_session_token(user['email'], user.get('full_name'))
 
-                    # 4. Rerun
+                    # 3. Rerun
                     st.rerun()
-                else:
-                    st.error("❌ Email ou mot de passe incorrect")
 
     with tab_signup:
         with st.form("signup_form"):
@@ -318,19 +1051,38 @@ if not st.session_state.authenticated:
                 elif len(new_password) < 6:
                     st.error("❌ Mot de passe trop court (min 6 caractères)")
                 else:
-                    if create_user(new_email, new_password, new_name):
-                        st.success("✅ Compte créé! Connectez-vous maintenant.")
+                    # Chaque création coûte un hachage bcrypt : limitée par adresse IP
+                    limiter = get_login_limiter()
+                    keys = login_keys()
+                    retry_after = limiter.retry_after(keys)
+                    if retry_after > 0:
+                        st.error(f"⛔ Trop de tentatives. Réessayez dans {math.ceil(retry_after)} s.")
+                    else:
+                        limiter.record_failure(keys)
+                        if create_user(new_email, new_password, new_name):
+                            st.success("✅ Compte créé! Connectez-vous maintenant.")
 
     st.stop()
 
 # ============================================
 # APPLICATION PRINCIPALE
 # ============================================
+# Compte actif : reçoit les nouveaux trades et imports, sert au calculateur de position.
+# Les autres vues portent sur le portefeuille (tous les comptes).
+accounts = get_user_accounts(st.session_state.user_email)
+accounts_by_id = {account['id']: account for account in accounts}
+if 'pending_account_id' in st.session_state:
+    st.session_state.account_id = st.session_state.pop('pending_account_id')
+if st.session_state.get('account_id') not in accounts_by_id:
+    st.session_state.account_id = accounts[0]['id']
 
 col1, col2, col3 = st.columns([1, 2, 1])
 
 with col1:
     st.markdown(f"**👤 {st.session_state.user_name}**")
+    if len(accounts) > 1:
+        st.selectbox("💼 Compte actif", list(accounts_by_id), format_func=lambda account_id: accounts_by_id[account_id]['name'],
+                     key="account_id")
 
 with col2:
     try:
@@ -340,57 +1092,115 @@ with col2:
 
 with col3:
     if st.button("🚪 Déconnexion"):
-        cookie_manager.delete("user_email")
+        if cookie_manager.get(SESSION_COOKIE):
+            cookie_manager.delete(SESSION_COOKIE)
         st.session_state.authenticated = False
         st.session_state.user_email = None
         st.session_state.user_name = None
         st.rerun()
 
+if st.session_state.get('pending_cookie'):
+    cookie_manager.set(SESSION_COOKIE, st.session_state.pop('pending_cookie'),
+                       expires_at=datetime.now() + timedelta(days=SESSION_TTL_DAYS))
+
 st.markdown("---")
 
-capital_total = st.session_state.capital_reel + st.session_state.credit_broker
+render_trade_writes()
 
-# ============================================
-# TABS NAVIGATION (4 TABS)
-# ============================================
-tab1, tab2, tab3, tab4 = st.tabs(["🏠 Dashboard", "⚡ Position", "📖 Journal", "📊 Analytics"])
+if is_admin():
+    with st.expander("🔐 Métriques serveur (admin)"):
+        hasher = get_password_hasher()
+        server_stats = METRICS.snapshot()
+        counters = server_stats['counters']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("⚙️ Workers bcrypt", f"{hasher.workers} (coût {hasher.rounds})")
+        col2.metric("⏳ Hachages en cours", hasher.pending)
+        col3.metric("✅ / ❌ Connexions", f"{counters.get('login_success', 0)} / {counters.get('login_failure', 0)}")
+        col4.metric("⛔ Refus (saturation)", counters.get('bcrypt_rejected', 0))
+        figure_stats = get_figure_cache().stats()
+        hits, misses = counters.get('figure_cache_hit', 0), counters.get('figure_cache_miss', 0)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("🖼️ Figures en cache", f"{figure_stats['entries']} / {FIGURE_CACHE_MAX_ENTRIES}")
+        col2.metric("💾 Taille du cache", f"{figure_stats['bytes'] / 1e6:.1f} / {FIGURE_CACHE_MAX_MB:g} Mo")
+        col3.metric("🎯 Hits figures", f"{hits / (hits + misses) * 100:.0f}%" if hits + misses else "—")
+        if server_stats['latency']:
+            st.dataframe(pd.DataFrame.from_dict(server_stats['latency'], orient='index').sort_index(), width="stretch",
+                         column_config={
+                             'count': st.column_config.NumberColumn("Mesures"),
+                             'p50_ms': st.column_config.NumberColumn("p50 (ms)", format="%.0f"),
+                             'p95_ms': st.column_config.NumberColumn("p95 (ms)", format="%.0f"),
+                             'max_ms': st.column_config.NumberColumn("Max (ms)", format="%.0f"),
+                         })
+        st.download_button("📥 Export Prometheus", data=METRICS.prometheus_text(), file_name="tradeflow_metrics.prom",
+                           mime="text/plain", key="metrics_export")
+
+active_account = accounts_by_id[st.session_state.account_id]
+account_capital = active_account['capital_reel'] + active_account['credit_broker']
+st.session_state.capital_reel = sum(account['capital_reel'] for account in accounts)
+st.session_state.credit_broker = sum(account['credit_broker'] for account in accounts)
+capital_total = st.session_state.capital_reel + st.session_state.credit_broker
 
 # ============================================
 # TAB 1: DASHBOARD
 # ============================================
-with tab1:
+def render_dashboard():
+    # Capital du compte actif, sauvegardé dès la saisie (save_account_capital) : le rerun
+    # qui suit relit les comptes, tous les onglets voient donc la nouvelle valeur
     st.markdown("### 💎 Votre Capital")
+    account_label = f" — {active_account['name']}" if len(accounts) > 1 else ""
 
     col_input1, col_input2 = st.columns(2)
     with col_input1:
-        capital_reel = st.number_input(
-            "💰 Capital Réel (€)",
+        widget_key = f"capital_input_{active_account['id']}"
+        st.number_input(
+            f"💰 Capital Réel{account_label} (€)",
             min_value=0.0,
-            value=st.session_state.capital_reel,
+            value=float(active_account['capital_reel']),
             step=50.0,
-            key="capital_input"
+            key=widget_key,
+            on_change=save_account_capital,
+            args=(active_account['id'], 'capital_reel', widget_key)
         )
-        st.session_state.capital_reel = capital_reel
 
     with col_input2:
-        credit_broker = st.number_input(
-            "🏦 Crédit Broker (€)",
+        widget_key = f"credit_input_{active_account['id']}"
+        st.number_input(
+            f"🏦 Crédit Broker{account_label} (€)",
             min_value=0.0,
-            value=st.session_state.credit_broker,
+            value=float(active_account['credit_broker']),
             step=50.0,
-            key="credit_input"
+            key=widget_key,
+            on_change=save_account_capital,
+            args=(active_account['id'], 'credit_broker', widget_key)
         )
-        st.session_state.credit_broker = credit_broker
 
-    capital_total = capital_reel + credit_broker
+    with st.expander("➕ Nouveau compte"):
+        with st.form("new_account_form", clear_on_submit=True):
+            new_name = st.text_input("Nom du compte", placeholder="IC Markets - Swing")
+            col_a, col_b = st.columns(2)
+            new_capital = col_a.number_input("💰 Capital Réel (€)", min_value=0.0, value=DEFAULT_CAPITAL_REEL, step=50.0)
+            new_credit = col_b.number_input("🏦 Crédit Broker (€)", min_value=0.0, value=DEFAULT_CREDIT_BROKER, step=50.0)
+            if st.form_submit_button("Créer le compte", width="stretch"):
+                if not new_name.strip():
+                    st.error("❌ Nom du compte requis")
+                elif new_name.strip() in {account['name'] for account in accounts}:
+                    st.error("❌ Un compte porte déjà ce nom")
+                else:
+                    account = create_account(st.session_state.user_email, new_name.strip(), new_capital, new_credit)
+                    if account:
+                        st.session_state.pending_account_id = account['id']
+                        st.rerun()
+
+    capital_reel = st.session_state.capital_reel
+    portfolio_label = " (portefeuille)" if len(accounts) > 1 else ""
 
     st.markdown("---")
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("💰 Capital Réel", f"{capital_reel:.2f} €")
+        st.metric(f"💰 Capital Réel{portfolio_label}", f"{capital_reel:.2f} €")
     with col2:
-        st.metric("🏦 Crédit Broker", f"{credit_broker:.2f} €")
+        st.metric(f"🏦 Crédit Broker{portfolio_label}", f"{st.session_state.credit_broker:.2f} €")
     with col3:
         st.metric("💎 Total Equity", f"{capital_total:.2f} €")
 
@@ -399,7 +1209,7 @@ with tab1:
     trades_df = get_user_trades(st.session_state.user_email)
 
     if not trades_df.empty:
-        kpis = calculate_kpis(trades_df)
+        kpis = get_user_kpis(st.session_state.user_email, trades_df)
 
         st.markdown("### 📈 Performance Globale")
 
@@ -409,43 +1219,110 @@ with tab1:
         with col2:
             st.metric("💰 Profit Factor", f"{kpis['profit_factor']:.2f}")
         with col3:
-            total_pnl = trades_df['result'].sum()
-            st.metric("💵 Total P&L", f"{total_pnl:+.2f} €")
+            st.metric("💵 Total P&L", f"{kpis['total_pnl']:+.2f} €")
         with col4:
             st.metric("📊 Total Trades", f"{kpis['total_trades']}")
 
-        st.markdown("### 📈 Equity Curve")
-        trades_df_sorted = trades_df.sort_values('date')
-        trades_df_sorted['cumulative'] = trades_df_sorted['result'].cumsum() + capital_reel
-
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trades_df_sorted['date'],
-            y=trades_df_sorted['cumulative'],
-            mode='lines+markers',
-            name='Equity',
-            line=dict(color='#00c9ff', width=3),
-            marker=dict(size=6, color='#92fe9d')
-        ))
-
-        fig.update_layout(
-            template="plotly_dark",
-            height=400,
-            xaxis_title="Date",
-            yaxis_title="Capital (€)",
-            hovermode='x unified',
-            plot_bgcolor='#0e1117',
-            paper_bgcolor='#0e1117'
-        )
+        risk = get_user_risk(st.session_state.user_email, trades_df).summary(capital_reel)
+
+        st.markdown("### 🛡️ Risque")
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("📉 Max Drawdown", f"-{risk['max_drawdown']:.2f} €", f"-{risk['max_drawdown_pct']:.1f}%", delta_color="off")
+        with col2:
+            st.metric("🔻 Drawdown Actuel", f"-{risk['current_drawdown']:.2f} €",
+                      f"{risk['current_drawdown_days']} j (max {risk['longest_drawdown_days']} j)", delta_color="off")
+        with col3:
+            st.metric("📐 Sharpe / Sortino", f"{risk['sharpe']:.2f} / {risk['sortino']:.2f}")
+        with col4:
+            st.metric("🎲 Expectancy", f"{risk['expectancy']:+.2f} €", f"{risk['expectancy_r']:+.2f} R", delta_color="off")
 
-        st.plotly_chart(fig, use_container_width=True)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("🔥 Série Gagnante Max", f"{risk['longest_win_streak']}")
+        with col2:
+            st.metric("🧊 Série Perdante Max", f"{risk['longest_loss_streak']}")
+        with col3:
+            streak = risk['current_streak']
+            st.metric("⏱️ Série en Cours", f"{abs(streak)} {'gains' if streak > 0 else 'pertes' if streak < 0 else '-'}")
+        with col4:
+            st.metric("🏅 Meilleur / Pire (R)", f"{risk['best_trade_r']:+.1f} / {risk['worst_trade_r']:+.1f}")
+
+        st.markdown("### 📈 Equity Curve")
+        col_mode, col_gl = st.columns([3, 1])
+        with col_mode:
+            render_mode = st.radio("Rendu", EQUITY_RENDER_MODES, horizontal=True, key="equity_render_mode",
+                                   persist_state="page", label_visibility="collapsed")
+        with col_gl:
+            force_webgl = st.checkbox("⚡ WebGL", key="equity_webgl", persist_state="page")
+
+        def build_equity():
+            days, equity = equity_curve(trades_df, capital_reel)
+            idx = equity_plot_indices(days, equity, render_mode, EQUITY_CHART_WIDTH_PX)
+            use_webgl = force_webgl or len(idx) > EQUITY_WEBGL_THRESHOLD
+            return equity_figure(days[idx], equity[idx], use_webgl, len(idx) <= EQUITY_MARKERS_MAX_POINTS)
+
+        user_email = st.session_state.user_email
+        fig = cached_figure("equity", (user_email, get_trades_cache().get_trade_set_version(user_email, trades_df),
+                                       capital_reel, render_mode, force_webgl, EQUITY_CHART_WIDTH_PX), build_equity)
+        render_chart("equity", fig)
+        trace = fig.data[0]
+        if len(trace.x) < len(trades_df):
+            st.caption(f"{len(trace.x)} points affichés sur {len(trades_df)} trades "
+                       f"({render_mode}, {'WebGL' if trace.type == 'scattergl' else 'SVG'})")
+
+        if len(accounts) > 1:
+            st.markdown("### 💼 Portefeuille")
+            version = get_trades_cache().get_trade_set_version(user_email, trades_df)
+            capitals = tuple((account['id'], float(account['capital_reel'])) for account in accounts)
+            portfolio = cached_portfolio(version, capitals, trades_df)
+            names = [accounts_by_id[account_id]['name'] if account_id in accounts_by_id else "Sans compte"
+                     for account_id in portfolio['account_ids']]
+            st.dataframe(pd.DataFrame({
+                'account': names,
+                'trades': portfolio['trades'],
+                'winrate': np.divide(portfolio['wins'] * 100.0, portfolio['trades'],
+                                     out=np.zeros(len(names)), where=portfolio['trades'] > 0),
+                'pnl': portfolio['pnl'],
+                'capital': portfolio['start'],
+                'equity': portfolio['equity'][:, -1],
+            }), width="stretch", hide_index=True, column_config={
+                'account': st.column_config.TextColumn("Compte"),
+                'trades': st.column_config.NumberColumn("Trades"),
+                'winrate': st.column_config.NumberColumn("Winrate", format="%.1f%%"),
+                'pnl': st.column_config.NumberColumn("P&L", format="%+.2f €"),
+                'capital': st.column_config.NumberColumn("Capital Réel", format="%.2f €"),
+                'equity': st.column_config.NumberColumn("Equity", format="%.2f €"),
+            })
+            render_chart("portfolio", cached_figure("portfolio", (user_email, version, capitals), lambda: portfolio_figure(
+                portfolio['days'], portfolio['equity'], names, portfolio['total'])))
     else:
         st.info("📭 Aucune donnée. Ajoutez des trades dans le Journal!")
 
 # ============================================
 # TAB 2: CALCULATEUR DE POSITION
 # ============================================
-with tab2:
+def watchlist_editor_key():
+    return f"watchlist_editor_{st.session_state.get('watchlist_version', 0)}"
+
+def save_watchlist_edits():
+    # La watchlist vit dans st.session_state.watchlist (clé hors widget) : Streamlit efface
+    # l'état de l'éditeur dès que l'onglet n'est plus affiché. Les modifications y sont
+    # reportées à chaque changement, puis l'éditeur repart d'une nouvelle clé (sinon elles
+    # seraient appliquées deux fois).
+    edits = st.session_state[watchlist_editor_key()]
+    watchlist = st.session_state.watchlist.copy()
+    for row, changes in edits['edited_rows'].items():
+        for column, value in changes.items():
+            watchlist.iloc[int(row), watchlist.columns.get_loc(column)] = value
+    watchlist = watchlist.drop(watchlist.index[edits['deleted_rows']])
+    if edits['added_rows']:
+        watchlist = pd.concat([watchlist, pd.DataFrame(edits['added_rows'], columns=WATCHLIST_COLUMNS)])
+    st.session_state.watchlist = watchlist.reset_index(drop=True)
+    st.session_state.watchlist_version = st.session_state.get('watchlist_version', 0) + 1
+
+def render_position():
     st.markdown("### ⚡ Calculateur de Position")
 
     col_left, col_right = st.columns(2)
@@ -466,9 +1343,10 @@ with tab2:
         take_profit = st.number_input("Take Profit", min_value=0.0, value=2100.0 if "XAU" in selected_pair else 1.1100, step=0.01, format="%.4f")
 
         risque_pct = st.slider("🎯 Risque par Trade (%)", min_value=0.5, max_value=10.0, value=2.0, step=0.5)
-        montant_risque = capital_total * (risque_pct / 100)
+        montant_risque = account_capital * (risque_pct / 100)
 
-        st.info(f"💰 Montant à risquer : **{montant_risque:.2f} €**")
+        st.info(f"💰 Montant à risquer : **{montant_risque:.2f} €**"
+                + (f" (compte {active_account['name']})" if len(accounts) > 1 else ""))
 
         point_value = st.number_input(f"Point Value ({asset_info['currency']})", min_value=0.01, value=asset_info['point_value'], step=1.0)
 
@@ -493,49 +1371,202 @@ with tab2:
             st.metric("🟢 Potential Gain", f"+{gain_potentiel:.2f} €")
             st.metric("⚖️ Risk:Reward", f"1:{risk_reward:.2f}")
 
+            order = size_positions(account_capital, entry_price, stop_loss, take_profit, risque_pct, point_value,
+                                   asset_info['lot_step'], asset_info['min_lot'], asset_info['max_lot'])
+            if order['below_min']:
+                st.caption(f"⛔ Sous le lot minimum du broker ({asset_info['min_lot']} lot) : risque trop faible pour ce stop")
+            elif order['valid']:
+                st.caption(f"🧾 Ordre broker (pas de {asset_info['lot_step']}) : **{float(order['lots']):.2f} lots**, "
+                           f"perte max {float(order['max_loss']):.2f} €" + (" (plafonné au lot maximum)" if order['capped'] else ""))
+
             if risque_pct > 5:
                 st.error("🚨 RISQUE ÉLEVÉ : Plus de 5% du capital !")
             elif risk_reward >= 2:
                 st.success("✅ Excellent Risk:Reward ratio!")
 
+    st.markdown("---")
+    st.markdown("#### 📋 Watchlist")
+    st.caption("Une ligne par idée de trade : toutes les tailles sont calculées d'un coup pour chaque niveau de risque, "
+               "arrondies au pas de lot du broker.")
+
+    if 'watchlist' not in st.session_state:
+        st.session_state.watchlist = pd.DataFrame(
+            [{'pair': 'XAUUSD', 'entry': 2000.0, 'stop': 1950.0, 'target': 2100.0}], columns=WATCHLIST_COLUMNS)
+
+    watchlist_df = st.data_editor(
+        st.session_state.watchlist,
+        key=watchlist_editor_key(),
+        on_change=save_watchlist_edits,
+        num_rows="dynamic",
+        hide_index=True,
+        width="stretch",
+        column_config={
+            'pair': st.column_config.SelectboxColumn("Asset", options=list(ASSET_CONFIG.keys()), required=True),
+            'entry': st.column_config.NumberColumn("Entry", min_value=0.0, format="%.4f", required=True),
+            'stop': st.column_config.NumberColumn("Stop Loss", min_value=0.0, format="%.4f", required=True),
+            'target': st.column_config.NumberColumn("Take Profit", min_value=0.0, format="%.4f", required=True),
+        },
+    )
+    watchlist_risks = st.multiselect("🎯 Niveaux de risque (%)", WATCHLIST_RISK_LEVELS, default=[1.0, 2.0],
+                                     key="watchlist_risks", persist_state="page")
+
+    watchlist_rows = watchlist_df.dropna(subset=WATCHLIST_COLUMNS)
+    if not watchlist_rows.empty and watchlist_risks:
+        watchlist_risks = sorted(watchlist_risks)
+        grid = size_watchlist(account_capital, watchlist_rows, watchlist_risks)
+        n_rows, n_risks = grid['lots'].shape
+        repeat = lambda column: np.repeat(watchlist_rows[column].to_numpy(), n_risks)
+        sizing_df = pd.DataFrame({
+            'pair': repeat('pair'),
+            'entry': repeat('entry'),
+            'stop': repeat('stop'),
+            'target': repeat('target'),
+            'risk_pct': np.tile(watchlist_risks, n_rows),
+            'lots': grid['lots'].ravel(),
+            'max_loss': grid['max_loss'].ravel(),
+            'potential_gain': grid['potential_gain'].ravel(),
+            'risk_reward': grid['risk_reward'].ravel(),
+            'risk_pct_real': grid['risk_pct_real'].ravel(),
+            'note': np.select([~grid['valid'].ravel(), grid['below_min'].ravel(), grid['capped'].ravel()],
+                              ["⚠️ Paramètres invalides", "⛔ Sous le lot minimum", "🔒 Plafonné au lot maximum"], ""),
+        })
+        st.dataframe(
+            sizing_df,
+            hide_index=True,
+            width="stretch",
+            column_config={
+                'pair': st.column_config.TextColumn("Asset"),
+                'entry': st.column_config.NumberColumn("Entry", format="%.4f"),
+                'stop': st.column_config.NumberColumn("Stop Loss", format="%.4f"),
+                'target': st.column_config.NumberColumn("Take Profit", format="%.4f"),
+                'risk_pct': st.column_config.NumberColumn("Risque cible", format="%.1f %%"),
+                'lots': st.column_config.NumberColumn("Lots", format="%.2f"),
+                'max_loss': st.column_config.NumberColumn("Max Loss", format="-%.2f €"),
+                'potential_gain': st.column_config.NumberColumn("Potential Gain", format="+%.2f €"),
+                'risk_reward': st.column_config.NumberColumn("R:R", format="1:%.2f"),
+                'risk_pct_real': st.column_config.NumberColumn("Risque réel", format="%.2f %%"),
+                'note': st.column_config.TextColumn(""),
+            },
+        )
+
 # ============================================
 # TAB 3: JOURNAL DE TRADING
 # ============================================
-with tab3:
-    st.markdown("### 📖 Journal de Trading")
-
-    trades_df = get_user_trades(st.session_state.user_email)
-
-    if not trades_df.empty:
-        st.markdown("#### 📜 Historique des Trades")
+def browser_timezone():
+    # Fuseau du navigateur (l'heure saisie est une heure locale), sinon celui du serveur
+    try:
+        return ZoneInfo(st.context.timezone)
+    except Exception:
+        return datetime.now().astimezone().tzinfo
 
-        display_df = trades_df[['date', 'pair', 'direction', 'entry_price', 'exit_price', 'lots', 'result']].copy()
-        display_df['result'] = display_df['result'].apply(lambda x: f"{'+' if x > 0 else ''}{x:.2f} €")
-        display_df.columns = ['Date', 'Asset', 'Direction', 'Entry', 'Exit', 'Lots', 'P&L']
+def render_journal():
+    st.markdown("### 📖 Journal de Trading")
 
-        st.dataframe(display_df, use_container_width=True, height=400, hide_index=True)
+    st.markdown("#### 📜 Historique des Trades")
+
+    col_from, col_to, col_pairs, col_dirs, col_size = st.columns([1, 1, 2, 1.5, 1])
+    with col_from:
+        journal_from = st.date_input("Du", value=None, key="journal_from", persist_state="page")
+    with col_to:
+        journal_to = st.date_input("Au", value=None, key="journal_to", persist_state="page")
+    with col_pairs:
+        journal_pairs = st.multiselect("Assets", list(ASSET_CONFIG.keys()), key="journal_pairs", persist_state="page")
+    with col_dirs:
+        journal_directions = st.multiselect("Direction", ["Long", "Short"], key="journal_directions", persist_state="page")
+    with col_size:
+        journal_page_size = st.selectbox("Lignes", JOURNAL_PAGE_SIZES, key="journal_page_size", persist_state="page")
+
+    journal_filters = (
+        journal_from.strftime("%Y-%m-%d") if journal_from else None,
+        journal_to.strftime("%Y-%m-%d") if journal_to else None,
+        tuple(journal_pairs),
+        tuple(journal_directions),
+        journal_page_size,
+    )
+    # Nouvelle recherche : retour à la première page
+    if st.session_state.get('journal_filters') != journal_filters:
+        st.session_state.journal_filters = journal_filters
+        st.session_state.journal_cursors = [None]
+
+    page_df, has_next = fetch_journal_page(
+        st.session_state.user_email, get_trades_cache().version(st.session_state.user_email),
+        *journal_filters[:4], st.session_state.journal_cursors[-1], journal_page_size
+    )
+    page_number = len(st.session_state.journal_cursors)
+    filtered = any(journal_filters[:4])
+
+    if not page_df.empty:
+        st.dataframe(
+            page_df,
+            width="stretch",
+            height=400,
+            hide_index=True,
+            column_order=['date', 'pair', 'direction', 'entry_price', 'exit_price', 'lots', 'result'],
+            column_config={
+                'date': st.column_config.TextColumn("Date"),
+                'pair': st.column_config.TextColumn("Asset"),
+                'direction': st.column_config.TextColumn("Direction"),
+                'entry_price': st.column_config.NumberColumn("Entry"),
+                'exit_price': st.column_config.NumberColumn("Exit"),
+                'lots': st.column_config.NumberColumn("Lots"),
+                'result': st.column_config.NumberColumn("P&L", format="%+.2f €"),
+            },
+        )
 
-        col1, col2 = st.columns(2)
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            st.button("◀ Précédent", key="journal_prev", disabled=page_number == 1, on_click=journal_previous_page)
+        with col_page:
+            st.markdown(f"<p style='text-align: center; color: #8b92a7;'>Page {page_number}</p>", unsafe_allow_html=True)
+        with col_next:
+            last = page_df.iloc[-1]
+            st.button("Suivant ▶", key="journal_next", disabled=not has_next,
+                      on_click=journal_next_page, args=((str(last['date']), int(last['id'])),))
+
+        col1, col2, col3 = st.columns([2, 1, 1])
         with col1:
             if st.button("🗑️ Supprimer tous les trades"):
-                if delete_user_trades(st.session_state.user_email):
-                    st.success("✅ Trades supprimés")
+                progress_bar = st.progress(0.0, text="Suppression en cours...")
+                deleted = delete_user_trades(st.session_state.user_email, progress=progress_bar.progress)
+                progress_bar.empty()
+                if deleted is not None:
+                    st.success(f"✅ {deleted} trades supprimés")
                     st.rerun()
+                else:
+                    st.error("❌ Suppression interrompue, relancez-la pour terminer")
         with col2:
-            csv = display_df.to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Export CSV", data=csv, file_name=f"trades_{datetime.now().strftime('%Y%m%d')}.csv", mime="text/csv")
+            export_format = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format",
+                                         persist_state="page", label_visibility="collapsed")
+        with col3:
+            extension, mime = EXPORT_FORMATS[export_format]
+            export_email = st.session_state.user_email
+            st.download_button(
+                f"📥 Export {export_format}",
+                data=lambda: export_trades(export_email, export_format),
+                file_name=f"trades_{datetime.now().strftime('%Y%m%d')}.{extension}",
+                mime=mime,
+                on_click="ignore",
+            )
+    elif filtered:
+        st.info("🔍 Aucun trade ne correspond aux filtres")
     else:
         st.info("📭 Aucun trade enregistré")
 
     st.markdown("---")
 
     st.markdown("#### ➕ Ajouter un Trade")
+    if len(accounts) > 1:
+        st.caption(f"💼 Compte : **{active_account['name']}** (compte actif, en haut de page)")
 
+    trade_tz = browser_timezone()
     with st.form("add_trade_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
 
         with col1:
-            trade_date = st.date_input("Date", datetime.now())
+            now = datetime.now(trade_tz)
+            trade_date = st.date_input("Date", now.date())
+            trade_time = st.time_input("Heure", now.time().replace(second=0, microsecond=0),
+                                       help=f"Heure locale ({trade_tz}), convertie en UTC pour l'analyse par heure / session")
             trade_pair = st.selectbox("Asset", list(ASSET_CONFIG.keys()))
             trade_direction = st.radio("Direction", ["Long", "Short"], horizontal=True)
             trade_entry = st.number_input("Entry Price", min_value=0.0, value=0.0, step=0.01, format="%.4f")
@@ -549,40 +1580,194 @@ with tab3:
 
         if submitted:
             if trade_entry > 0 and trade_exit > 0:
-                try:
-                    response = supabase.table('trades').insert({
-                        "user_email": st.session_state.user_email,
-                        "date": trade_date.strftime("%Y-%m-%d"),
-                        "pair": trade_pair,
-                        "direction": trade_direction,
-                        "entry_price": trade_entry,
-                        "exit_price": trade_exit,
-                        "lots": trade_lots,
-                        "result": trade_result,
-                        "timestamp": datetime.now().isoformat()
-                    }).execute()
-
-                    if response.data:
-                        st.success("✅ Trade sauvegardé !")
-                        time.sleep(1)
-                        st.rerun()
-                    else:
-                        st.error("❌ Erreur d'enregistrement Supabase")
-                except Exception as e:
-                    st.error(f"❌ Erreur: {str(e)}")
+                queue_trade({
+                    "user_email": st.session_state.user_email,
+                    "account_id": st.session_state.account_id or None,
+                    "date": trade_date.strftime("%Y-%m-%d"),
+                    "pair": trade_pair,
+                    "direction": trade_direction,
+                    "entry_price": trade_entry,
+                    "exit_price": trade_exit,
+                    "lots": trade_lots,
+                    "result": trade_result,
+                    "timestamp": datetime.combine(trade_date, trade_time, tzinfo=trade_tz).isoformat()
+                })
+                st.rerun()
             else:
                 st.error("❌ Veuillez remplir Entry Price et Exit Price")
 
+    with st.expander("📤 Importer des trades (CSV / MT4 / MT5)"):
+        st.caption("CSV exporté par TradeFlow, CSV/TSV générique ou rapport HTML MT4/MT5. "
+                   f"Actifs reconnus : {', '.join(ASSET_CONFIG)}."
+                   + (f" Importés dans le compte **{active_account['name']}**." if len(accounts) > 1 else ""))
+
+        if 'import_summary' in st.session_state:
+            st.success(st.session_state.pop('import_summary'))
+
+        uploader_key = f"import_file_{st.session_state.get('import_uploads', 0)}"
+        uploaded = st.file_uploader("Fichier", type=["csv", "tsv", "txt", "htm", "html"], key=uploader_key)
+
+        if uploaded is not None:
+            try:
+                import_df, rejected = parse_trades_file(uploaded.getvalue(), uploaded.name)
+            except Exception as e:
+                import_df, rejected = pd.DataFrame(), {}
+                st.error(f"❌ Fichier illisible : {str(e)}")
+
+            for reason, count in rejected.items():
+                st.warning(f"⚠️ {count} ligne(s) ignorée(s) : {reason}")
+
+            if not import_df.empty:
+                st.dataframe(import_df.head(20), width="stretch", hide_index=True)
+                if st.button(f"📥 Importer {len(import_df)} trades"):
+                    progress_bar = st.progress(0.0, text="Import en cours...")
+                    try:
+                        inserted, duplicates = import_trades(st.session_state.user_email, import_df, progress=progress_bar.progress,
+                                                             account_id=st.session_state.account_id or None)
+                        st.session_state.import_summary = f"✅ {inserted} trades importés, {duplicates} doublon(s) ignoré(s)"
+                        st.session_state.import_uploads = st.session_state.get('import_uploads', 0) + 1
+                        st.rerun()
+                    except Exception as e:
+                        progress_bar.empty()
+                        st.error(f"❌ Erreur: {str(e)}")
+
 # ============================================
 # TAB 4: ANALYTICS
 # ============================================
-with tab4:
+# Découpage -> (clé de time_buckets, titre de l'axe)
+TIME_BUCKET_VIEWS = {
+    "Jour de la semaine": ('weekday', "Jour"),
+    "Heure (UTC)": ('hour', "Heure UTC"),
+    "Session": ('session', "Session"),
+}
+
+def render_time_analytics(user_email):
+    st.markdown("#### 🗓️ Performance dans le Temps")
+
+    time_analytics = get_user_time_analytics(user_email)
+    if time_analytics is None:
+        st.info("ℹ️ Analyse temporelle indisponible : appliquez la migration 006_trades_hourly_rollup.sql")
+        return
+    time_key = (user_email, time_analytics['version'])
+
+    day_stats = time_analytics['day']
+    years = sorted(set(day_stats.index.year), reverse=True)
+    if st.session_state.get("calendar_year") not in years:
+        st.session_state.pop("calendar_year", None)
+    year = st.selectbox("Année", years, key="calendar_year", persist_state="page")
+    year_stats = day_stats[day_stats.index.year == year]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(f"💰 P&L {year}", f"{year_stats['pnl'].sum():+.2f} €")
+    with col2:
+        st.metric("📅 Jours gagnants", f"{int((year_stats['pnl'] > 0).sum())} / {len(year_stats)}")
+    with col3:
+        best_day = year_stats['pnl'].idxmax()
+        st.metric("🏆 Meilleur jour", f"{year_stats['pnl'].max():+.2f} €", best_day.strftime("%d/%m"),
+                  delta_color="off")
+
+    render_chart("calendar", cached_figure("calendar", (*time_key, year), lambda: calendar_figure(
+        year_stats.index.to_numpy().astype('datetime64[D]'), year_stats['pnl'].to_numpy(),
+        year_stats['trades'].to_numpy())))
+
+    st.markdown("##### P&L Mensuel")
+    render_chart("monthly", cached_figure("monthly", time_key, lambda: monthly_figure(time_analytics['month'])))
+
+    view = st.radio("Découpage", list(TIME_BUCKET_VIEWS), horizontal=True, key="time_bucket", persist_state="page")
+    bucket, axis_title = TIME_BUCKET_VIEWS[view]
+    bucket_stats = time_analytics[bucket]
+    if bucket_stats.empty:
+        st.info("Aucun trade horodaté : heures et sessions indisponibles")
+        return
+    if bucket != 'weekday':
+        st.caption("Heure UTC d'enregistrement du trade. Sessions : "
+                   + ", ".join(f"{name} {start}h–{end}h" for name, (start, end) in TRADING_SESSIONS.items()))
+
+    render_chart(f"time_{bucket}", cached_figure(f"time_{bucket}", time_key,
+                                                 lambda: time_bucket_figure(bucket_stats, axis_title)))
+    st.dataframe(bucket_stats[['trades', 'pnl', 'winrate', 'expectancy', 'profit_factor']],
+                 width="stretch", column_config={
+                     'trades': st.column_config.NumberColumn("Trades"),
+                     'pnl': st.column_config.NumberColumn("P&L", format="%+.2f €"),
+                     'winrate': st.column_config.NumberColumn("Winrate", format="%.1f%%"),
+                     'expectancy': st.column_config.NumberColumn("Expectancy", format="%+.2f €"),
+                     'profit_factor': st.column_config.NumberColumn("Profit Factor", format="%.2f"),
+                 })
+
+def render_monte_carlo(user_email):
+    st.markdown("#### 🎲 Simulation Monte Carlo")
+    st.caption("Trajectoires d'equity futures tirées au hasard (avec remise) dans votre historique de trades, "
+               f"à partir du capital total ({capital_total:.2f} €).")
+    # Rééchantillonne chaque trade : en mode agrégats serveur, l'historique complet n'est
+    # chargé qu'à la demande
+    if ANALYTICS_SOURCE == "server" and not st.toggle("Charger l'historique complet pour la simulation",
+                                                     key="mc_load_trades", persist_state="page"):
+        st.info("Mode agrégats serveur : la simulation tire au hasard dans chaque trade et nécessite "
+                "de charger tout le journal.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        mc_mode = MONTE_CARLO_MODES[st.radio("Tirage", list(MONTE_CARLO_MODES), key="mc_mode", persist_state="page")]
+        mc_risk = st.slider("Risque par trade (%)", 0.25, 5.0, 1.0, 0.25, key="mc_risk", persist_state="page",
+                            disabled=mc_mode != "r")
+    with col2:
+        mc_horizon = st.number_input("Horizon (trades)", min_value=10, max_value=2000, value=250, step=10,
+                                     key="mc_horizon", persist_state="page")
+    with col3:
+        mc_paths = st.selectbox("Trajectoires", MONTE_CARLO_PATHS, index=1, format_func=lambda n: f"{n:,}".replace(",", " "),
+                                key="mc_paths", persist_state="page")
+    with col4:
+        mc_ruin = st.slider("Ruine = perte de (%)", 10, 100, 50, 5, key="mc_ruin", persist_state="page")
+
+    trades_df = get_user_trades(user_email)
+    if trades_df.empty:
+        st.info("Historique des trades indisponible pour le moment, réessayez dans quelques instants.")
+        return
+    mc_results = trades_df['result'].to_numpy(dtype=np.float64)
+    with st.spinner("Simulation en cours..."):
+        mc_fingerprint = trades_fingerprint(mc_results)
+        simulation = cached_monte_carlo(mc_fingerprint, mc_results, int(mc_paths), int(mc_horizon),
+                                        float(capital_total), mc_mode, float(mc_risk), float(mc_ruin))
+
+    if simulation is None:
+        st.info("Le tirage en R nécessite au moins un trade perdant (1R = perte moyenne).")
+        return
+
+    final = simulation['final_percentiles']
+    drawdowns = simulation['drawdown_percentiles']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("☠️ Risque de Ruine", f"{simulation['risk_of_ruin']:.2f}%")
+    with col2:
+        st.metric("📉 Probabilité de Perte", f"{simulation['prob_loss']:.1f}%")
+    with col3:
+        st.metric("🎯 Equity Médiane", f"{final[50]:.2f} €", f"{final[50] - capital_total:+.2f} €")
+    with col4:
+        st.metric("🕳️ Drawdown Max (médian / p95)", f"{drawdowns[50]:.1f}% / {drawdowns[95]:.1f}%")
+
+    mc_key = (user_email, mc_fingerprint, int(mc_paths), int(mc_horizon), float(capital_total),
+              mc_mode, float(mc_risk), float(mc_ruin))
+    render_chart("monte_carlo", cached_figure("monte_carlo", mc_key, lambda: monte_carlo_figure(
+        simulation, FAN_PERCENTILES, capital_total, capital_total * (1 - mc_ruin / 100))))
+
+    st.dataframe(
+        pd.DataFrame({
+            'Percentile': [f"p{p}" for p in DRAWDOWN_PERCENTILES],
+            'Drawdown max': [drawdowns[p] for p in DRAWDOWN_PERCENTILES],
+        }),
+        hide_index=True,
+        column_config={'Drawdown max': st.column_config.NumberColumn(format="%.1f %%")},
+    )
+
+def render_analytics():
     st.markdown("### 📊 Analytics & Statistiques Avancées")
 
-    trades_df = get_user_trades(st.session_state.user_email)
+    analytics = get_user_analytics(st.session_state.user_email)
 
-    if not trades_df.empty:
-        kpis = calculate_kpis(trades_df)
+    if analytics is not None:
+        kpis = analytics['kpis']
 
         st.markdown("#### 🎯 KPIs Détaillés")
 
@@ -600,23 +1785,8 @@ with tab4:
 
         st.markdown("#### 🌍 Distribution par Asset")
 
-        asset_counts = trades_df['pair'].value_counts()
-
-        fig_assets = go.Figure(data=[go.Pie(
-            labels=asset_counts.index,
-            values=asset_counts.values,
-            hole=0.4,
-            marker=dict(colors=['#00c9ff', '#92fe9d', '#ff6b6b', '#ffd93d', '#a29bfe', '#fd79a8'])
-        )])
-
-        fig_assets.update_layout(
-            template="plotly_dark",
-            height=400,
-            plot_bgcolor='#0e1117',
-            paper_bgcolor='#0e1117'
-        )
-
-        st.plotly_chart(fig_assets, use_container_width=True)
+        chart_key = (st.session_state.user_email, analytics['version'])
+        render_chart("assets", cached_figure("assets", chart_key, lambda: assets_figure(kpis['by_pair'])))
 
         st.markdown("---")
 
@@ -625,54 +1795,83 @@ with tab4:
         col1, col2 = st.columns(2)
 
         with col1:
-            long_trades = trades_df[trades_df['direction'] == 'Long']
-            if not long_trades.empty:
-                long_pnl = long_trades['result'].sum()
-                long_winrate = (len(long_trades[long_trades['result'] > 0]) / len(long_trades)) * 100
-                st.metric("📈 Long P&L", f"{long_pnl:+.2f} €")
-                st.metric("🎯 Long Winrate", f"{long_winrate:.1f}%")
+            long_stats = kpis['by_direction'].get('Long')
+            if long_stats:
+                st.metric("📈 Long P&L", f"{long_stats['pnl']:+.2f} €")
+                st.metric("🎯 Long Winrate", f"{long_stats['winrate']:.1f}%")
             else:
                 st.info("Aucun trade Long")
 
         with col2:
-            short_trades = trades_df[trades_df['direction'] == 'Short']
-            if not short_trades.empty:
-                short_pnl = short_trades['result'].sum()
-                short_winrate = (len(short_trades[short_trades['result'] > 0]) / len(short_trades)) * 100
-                st.metric("📉 Short P&L", f"{short_pnl:+.2f} €")
-                st.metric("🎯 Short Winrate", f"{short_winrate:.1f}%")
+            short_stats = kpis['by_direction'].get('Short')
+            if short_stats:
+                st.metric("📉 Short P&L", f"{short_stats['pnl']:+.2f} €")
+                st.metric("🎯 Short Winrate", f"{short_stats['winrate']:.1f}%")
             else:
                 st.info("Aucun trade Short")
 
         st.markdown("---")
 
-        st.markdown("#### 📊 Distribution des Résultats")
+        render_time_analytics(st.session_state.user_email)
 
-        fig_dist = go.Figure()
+        st.markdown("---")
 
-        fig_dist.add_trace(go.Histogram(
-            x=trades_df['result'],
-            nbinsx=20,
-            marker=dict(
-                color=trades_df['result'],
-                colorscale=[[0, '#ff6b6b'], [0.5, '#ffd93d'], [1, '#92fe9d']],
-                line=dict(color='#0e1117', width=1)
-            )
-        ))
+        st.markdown("#### 📊 Distribution des Résultats")
 
-        fig_dist.update_layout(
-            template="plotly_dark",
-            height=400,
-            xaxis_title="P&L (€)",
-            yaxis_title="Nombre de trades",
-            plot_bgcolor='#0e1117',
-            paper_bgcolor='#0e1117'
-        )
+        render_chart("distribution", cached_figure("distribution", chart_key,
+                                                   lambda: distribution_figure(analytics['histogram'])))
 
-        st.plotly_chart(fig_dist, use_container_width=True)
+        st.markdown("---")
+
+        render_monte_carlo(st.session_state.user_email)
 
     else:
         st.info("📭 Aucune donnée pour l'analyse. Ajoutez des trades dans le Journal!")
 
+# ============================================
+# TABS NAVIGATION (4 TABS)
+# ============================================
+# Onglets paresseux : seul l'onglet ouvert exécute ses requêtes et construit ses
+# graphiques ; changer d'onglet relance le script. LAZY_TABS=0 : tout est exécuté
+# à chaque rerun (changement d'onglet instantané, sans aller-retour serveur).
+# Un widget non affiché perd son état : les widgets à clé des vues portent
+# persist_state="page" et la watchlist est gardée hors widget (save_watchlist_edits).
+LAZY_TABS = os.getenv("LAZY_TABS", "1") != "0"
+VIEWS = {
+    "🏠 Dashboard": render_dashboard,
+    "⚡ Position": render_position,
+    "📖 Journal": render_journal,
+    "📊 Analytics": render_analytics,
+}
+
+tabs = st.tabs(list(VIEWS), key="active_view", on_change="rerun" if LAZY_TABS else "ignore")
+for tab, render_view in zip(tabs, VIEWS.values()):
+    # open vaut None quand les onglets ne suivent pas leur état (mode non paresseux)
+    if tab.open is not False:
+        with tab:
+            with METRICS.timer(f"view.{render_view.__name__.removeprefix('render_')}"):
+                render_view()
+
 st.markdown("---")
 st.markdown("<p style='text-align: center; color: #8b92a7; font-size: 12px;'>🌊 TradeFlow | Professional Trading Intelligence | Powered by Supabase</p>", unsafe_allow_html=True)
+
+# ============================================
+# PROFIL DU RERUN (ADMIN / LOGS)
+# ============================================
+rerun_profile = METRICS.finish_profile()
+if rerun_profile is not None:
+    rerun_summary = profile_summary(*rerun_profile)
+    if METRICS_SLOW_RERUN_MS and rerun_summary['total_ms'] >= METRICS_SLOW_RERUN_MS:
+        metrics_logger.warning(json.dumps({'event': 'slow_rerun', 'user': st.session_state.user_email,
+                                           **rerun_summary}, default=str))
+    if is_admin():
+        with st.expander(f"⏱️ Profil de ce rerun : {rerun_summary['total_ms']:.0f} ms (admin)"):
+            st.caption("Opérations imbriquées (db.* dans trades.load, chart.* dans l'onglet...) : les durées se recouvrent.")
+            st.dataframe(pd.DataFrame(rerun_summary['operations']), width="stretch", hide_index=True,
+                         column_config={
+                             'operation': st.column_config.TextColumn("Opération"),
+                             'count': st.column_config.NumberColumn("Appels"),
+                             'total_ms': st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                             'share_pct': st.column_config.ProgressColumn("Part du rerun", format="%.0f %%",
+                                                                          min_value=0, max_value=100),
+                         })
@@ -0,0 +1,179 @@
+# ============================================
+# AUTH : POOL BCRYPT BORNÉ, LIMITEUR DE TENTATIVES
+# ============================================
+# Module sans Streamlit, appelé depuis app.py. Le hachage tourne dans un pool partagé :
+# le thread de la session attend toujours son résultat (la connexion dure le temps
+# d'un bcrypt), mais le nombre de hachages simultanés est borné par le nombre de
+# workers, la file d'attente aussi (backpressure), et un limiteur de tentatives
+# protège contre le brute force.
+import base64
+import bisect
+import hashlib
+import hmac
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+from metrics import LatencyStats
+
+
+class AuthBusyError(Exception):
+    # File d'attente du pool pleine : le serveur refuse plutôt que de s'effondrer
+    pass
+
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def _fork_available() -> bool:
+    # fork absent sous Windows ; sous macOS, il peut planter les process qui ont chargé
+    # des frameworks système (Python y utilise "spawn" par défaut depuis 3.8)
+    return sys.platform != "darwin" and "fork" in multiprocessing.get_all_start_methods()
+
+
+class PasswordHasher:
+    # Pool borné : au plus max_pending hachages en attente ou en cours.
+    # Au-delà, on attend queue_timeout secondes puis AuthBusyError. hash / verify sont
+    # bloquants pour l'appelant : le pool limite le CPU consommé, pas la latence.
+    # mode "thread" (défaut) : bcrypt libère le GIL, les threads hachent en parallèle.
+    # mode "process" (opt-in) : workers forkés à la première connexion, donc depuis le
+    # serveur Streamlit déjà multi-threadé ; un verrou tenu par un autre thread au moment
+    # du fork peut bloquer le worker. Pas de "spawn" : Streamlit enregistre le script
+    # comme __main__, que chaque worker réexécuterait. Sans fork (Windows, et macOS où
+    # il est déconseillé), repli sur le mode "thread".
+    def __init__(self, rounds: int, workers: int, max_pending: int, queue_timeout: float, stats: LatencyStats,
+                 mode: str = "thread"):
+        if mode == "process" and not _fork_available():
+            mode = "thread"
+        self.rounds = rounds
+        self.workers = workers
+        self.mode = mode
+        self.queue_timeout = queue_timeout
+        self.stats = stats
+        if mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tradeflow-bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _run(self, name, fn, *args):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats.increment('bcrypt_rejected')
+            raise AuthBusyError("Serveur d'authentification saturé")
+        with self._lock:
+            self._pending += 1
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            self.stats.record(name, time.perf_counter() - start)
+
+    def hash(self, password: str) -> str:
+        return self._run('bcrypt_hash', _hashpw, password, self.rounds)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run('bcrypt_verify', _checkpw, password, hashed)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginRateLimiter:
+    # Fenêtre glissante d'échecs par clé ("email:...", "ip:..."). Une clé est bloquée
+    # quand elle atteint sa limite d'échecs dans la fenêtre.
+    def __init__(self, window_seconds: float, limits: dict):
+        # limits : préfixe de clé -> nombre d'échecs autorisés ({'email': 5, 'ip': 20})
+        self.window = window_seconds
+        self.limits = limits
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now):
+        failures = self._failures.get(key)
+        if failures is None:
+            return []
+        del failures[:bisect.bisect_right(failures, now - self.window)]
+        if not failures:
+            del self._failures[key]
+        return failures
+
+    def retry_after(self, keys):
+        # Secondes d'attente avant la prochaine tentative autorisée (0 = autorisée)
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in keys:
+                failures = self._prune(key, now)
+                limit = self.limits.get(key.split(':', 1)[0])
+                if limit and len(failures) >= limit:
+                    wait = max(wait, failures[-limit] + self.window - now)
+        return wait
+
+    def record_failure(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > 10_000:
+                for key in list(self._failures):
+                    self._prune(key, now)
+            for key in keys:
+                self._failures.setdefault(key, []).append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+# ============================================
+# JETONS DE SESSION SIGNÉS (HMAC-SHA256)
+# ============================================
+# Format : base64url(payload JSON) "." base64url(signature). Vérifiés localement,
+# sans aller-retour base : seul le serveur connaît le secret.
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def sign_session_token(secret: bytes, email: str, full_name: str, ttl_seconds: float) -> str:
+    now = int(time.time())
+    payload = json.dumps({'email': email, 'name': full_name, 'iat': now, 'exp': now + int(ttl_seconds)},
+                         separators=(',', ':')).encode('utf-8')
+    signature = hmac.new(secret, payload, hashlib.sha256).digest()
+    return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+
+def read_session_token(secret: bytes, token: str):
+    # Renvoie {'email', 'name', 'iat', 'exp'} si la signature est valide et le jeton non expiré, sinon None
+    try:
+        payload_part, signature_part = token.split('.')
+        payload = _b64decode(payload_part)
+        expected = hmac.new(secret, payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_part)):
+            return None
+        session = json.loads(payload)
+        if session['exp'] < time.time():
+            return None
+        return session
+    except Exception:
+        return None
@@ -0,0 +1,149 @@
+# ============================================
+# BENCHMARKS DES CHEMINS CRITIQUES
+# ============================================
+# Journaux synthétiques (1k, 100k, 1M trades sur les actifs d'ASSET_CONFIG) chargés
+# dans une base SQLite locale, puis chaque étape est chronométrée (médiane de
+# --repeat passes) et mesurée en pic mémoire Python (tracemalloc, passe séparée).
+#
+#   python benchmark.py                              # 1k, 100k, 1M
+#   python benchmark.py --sizes 1000 100000 --repeat 5
+#   python benchmark.py --format jsonl -o avant.jsonl   # à comparer entre deux commits
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from analytics import (ASSET_CONFIG, RiskMetrics, TRADE_FRAME_COLUMNS, calculate_kpis, equity_curve,
+                       equity_plot_indices, portfolio_equity, time_buckets)
+from charts import equity_figure
+from report import load_user_trades
+from storage import SQLiteStorage
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+BENCH_USER = "bench@tradeflow.local"
+BENCH_CAPITAL = 733.18
+# Trades répartis sur autant de comptes (vue portefeuille)
+BENCH_ACCOUNTS = 10
+# Valeurs par défaut de l'app (EQUITY_CHART_WIDTH_PX, seuils WebGL / marqueurs, page du journal)
+CHART_WIDTH_PX = 1200
+WEBGL_THRESHOLD = 5000
+MARKERS_MAX_POINTS = 500
+JOURNAL_PAGE_SIZE = 50
+INSERT_BATCH = 10_000
+
+
+def synthetic_rows(n_trades: int, user_email: str, seed: int = 42):
+    # Trades répartis sur ~5 ans, plusieurs par jour, à une heure UTC aléatoire, et sur
+    # BENCH_ACCOUNTS comptes ; résultats ~ N(5, 60) € ; par lots (mémoire bornée)
+    rng = np.random.default_rng(seed)
+    pairs = np.array(sorted(ASSET_CONFIG))
+    start = np.datetime64('2020-01-01')
+    for offset in range(0, n_trades, INSERT_BATCH):
+        size = min(INSERT_BATCH, n_trades - offset)
+        days = start + ((offset + np.arange(size)) * (5 * 365) // n_trades).astype('timedelta64[D]')
+        entry = rng.uniform(100, 40_000, size).round(2)
+        exit_ = (entry * (1 + rng.normal(0, 0.005, size))).round(2)
+        stamps = days + rng.integers(0, 24 * 3600, size).astype('timedelta64[s]')
+        yield [{'user_email': user_email, 'account_id': int(account_id), 'date': str(day), 'pair': str(pair),
+                'direction': direction, 'entry_price': float(e), 'exit_price': float(x), 'lots': float(lots),
+                'result': float(result), 'timestamp': f"{stamp}Z"}
+               for account_id, day, stamp, pair, direction, e, x, lots, result in zip(
+                   rng.integers(1, BENCH_ACCOUNTS + 1, size), days, stamps, rng.choice(pairs, size),
+                   rng.choice(['Long', 'Short'], size), entry, exit_, rng.choice([0.01, 0.1, 0.5, 1.0], size),
+                   rng.normal(5, 60, size).round(2))]
+
+
+def chart_json(days, equity, idx):
+    # Equity Curve du Dashboard (mêmes seuils WebGL / marqueurs), sérialisée comme pour le navigateur
+    return equity_figure(days[idx], equity[idx], len(idx) > WEBGL_THRESHOLD, len(idx) <= MARKERS_MAX_POINTS).to_json()
+
+
+def journal_apply(trades_df):
+    # Ancien rendu du journal : tout l'historique formaté ligne par ligne (référence)
+    display_df = trades_df[['date', 'pair', 'direction', 'entry_price', 'exit_price', 'lots', 'result']].copy()
+    display_df['result'] = display_df['result'].apply(lambda x: f"{'+' if x > 0 else ''}{x:.2f} €")
+    return display_df
+
+
+def measure(fn, repeat: int):
+    # Passe tracemalloc d'abord : elle sert aussi de chauffe (imports, caches Plotly)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(times) * 1000, 'min_ms': min(times) * 1000, 'peak_mb': peak / 1e6}
+
+
+def run_size(n_trades: int, repeat: int, workdir: str):
+    storage = SQLiteStorage(os.path.join(workdir, f"bench_{n_trades}.db"))
+    for rows in synthetic_rows(n_trades, BENCH_USER):
+        storage.insert_trades(rows)
+
+    trades_df = load_user_trades(storage, BENCH_USER)
+    days, equity = equity_curve(trades_df, BENCH_CAPITAL)
+    auto_idx = equity_plot_indices(days, equity, "Auto", CHART_WIDTH_PX)
+    full_idx = np.arange(len(equity))
+    columns = ",".join(TRADE_FRAME_COLUMNS)
+    capitals = {account_id: BENCH_CAPITAL for account_id in range(1, BENCH_ACCOUNTS + 1)}
+
+    steps = {
+        'load_trades': lambda: load_user_trades(storage, BENCH_USER),
+        'kpis': lambda: calculate_kpis(trades_df),
+        'risk_metrics': lambda: RiskMetrics.from_trades(trades_df).summary(BENCH_CAPITAL),
+        'equity_curve': lambda: equity_curve(trades_df, BENCH_CAPITAL),
+        'equity_downsample': lambda: equity_plot_indices(days, equity, "Auto", CHART_WIDTH_PX),
+        'portfolio_equity': lambda: portfolio_equity(trades_df, capitals),
+        'time_buckets': lambda: time_buckets(storage.fetch_time_rollup(BENCH_USER)),
+        'journal_apply': lambda: journal_apply(trades_df),
+        'journal_page': lambda: pd.DataFrame(storage.fetch_journal_page(
+            BENCH_USER, columns, None, None, (), (), None, JOURNAL_PAGE_SIZE + 1)),
+        'chart_json_auto': lambda: chart_json(days, equity, auto_idx),
+        'chart_json_full': lambda: chart_json(days, equity, full_idx),
+    }
+    results = []
+    for name, fn in steps.items():
+        result = {'step': name, 'trades': n_trades, **measure(fn, repeat)}
+        results.append(result)
+        print(f"{n_trades:>9,} {name:<18} {result['median_ms']:>10.1f} ms {result['min_ms']:>10.1f} ms "
+              f"{result['peak_mb']:>9.1f} Mo", file=sys.stderr, flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks TradeFlow : chargement, KPIs, equity, journal, graphiques")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="tailles de journal (trades)")
+    parser.add_argument("--repeat", type=int, default=3, help="passes chronométrées par étape (médiane)")
+    parser.add_argument("--format", choices=["table", "jsonl"], default="table", dest="output_format")
+    parser.add_argument("-o", "--output", help="fichier de résultats jsonl (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    print(f"{'trades':>9} {'étape':<18} {'médiane':>13} {'min':>13} {'pic mémoire':>12}", file=sys.stderr)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="tradeflow-bench-") as workdir:
+        for n_trades in args.sizes:
+            results.extend(run_size(n_trades, args.repeat, workdir))
+
+    if args.output_format == "jsonl" or args.output:
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# ============================================
+# GRAPHIQUES PLOTLY
+# ============================================
+# Construction des figures, sans Streamlit : app.py les affiche, benchmark.py les
+# sérialise. Chaque construction est mesurée ("chart.<nom>") dans metrics.METRICS.
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from metrics import METRICS, timed
+
+DARK_LAYOUT = dict(template="plotly_dark", plot_bgcolor='#0e1117', paper_bgcolor='#0e1117')
+ASSET_COLORS = ['#00c9ff', '#92fe9d', '#ff6b6b', '#ffd93d', '#a29bfe', '#fd79a8']
+
+
+@timed("chart.equity")
+def equity_figure(days, equity, use_webgl: bool, show_markers: bool):
+    # days / equity : points déjà sélectionnés (downsampling)
+    scatter = go.Scattergl if use_webgl else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(scatter(
+        x=days,
+        y=equity,
+        mode='lines+markers' if show_markers else 'lines',
+        name='Equity',
+        line=dict(color='#00c9ff', width=3),
+        marker=dict(size=6, color='#92fe9d')
+    ))
+    fig.update_layout(height=400, xaxis_title="Date", yaxis_title="Capital (€)", hovermode='x unified', **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.portfolio")
+def portfolio_figure(days, equity, names, total):
+    # equity : (n_comptes, n_jours) aligné sur days (analytics.portfolio_equity) ; total en blanc
+    fig = go.Figure()
+    for i, (name, curve) in enumerate(zip(names, equity)):
+        fig.add_trace(go.Scatter(x=days, y=curve, mode='lines', name=name,
+                                 line=dict(color=ASSET_COLORS[i % len(ASSET_COLORS)], width=2)))
+    fig.add_trace(go.Scatter(x=days, y=total, mode='lines', name="Portefeuille", line=dict(color='#ffffff', width=3)))
+    fig.update_layout(height=450, xaxis_title="Date", yaxis_title="Capital (€)", hovermode='x unified', **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.assets")
+def assets_figure(by_pair):
+    # by_pair : kpis['by_pair'] ; secteurs triés par nombre de trades décroissant
+    asset_counts = sorted(((stats['trades'], pair) for pair, stats in by_pair.items()), reverse=True)
+    fig = go.Figure(data=[go.Pie(
+        labels=[pair for _, pair in asset_counts],
+        values=[count for count, _ in asset_counts],
+        hole=0.4,
+        marker=dict(colors=ASSET_COLORS)
+    )])
+    fig.update_layout(height=400, **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.distribution")
+def distribution_figure(histogram):
+    # histogram : {'lower', 'upper', 'count'} (result_histogram / histogram_from_buckets)
+    centers = [(lo + hi) / 2 for lo, hi in zip(histogram['lower'], histogram['upper'])]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=centers,
+        y=histogram['count'],
+        width=[hi - lo for lo, hi in zip(histogram['lower'], histogram['upper'])],
+        marker=dict(
+            color=centers,
+            colorscale=[[0, '#ff6b6b'], [0.5, '#ffd93d'], [1, '#92fe9d']],
+            line=dict(color='#0e1117', width=1)
+        )
+    ))
+    fig.update_layout(height=400, xaxis_title="P&L (€)", yaxis_title="Nombre de trades", **DARK_LAYOUT)
+    return fig
+
+
+PNL_COLORSCALE = [[0, '#ff6b6b'], [0.5, '#1e2130'], [1, '#92fe9d']]
+WEEKDAY_SHORT = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
+MONTH_SHORT = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+
+
+@timed("chart.calendar")
+def calendar_figure(days, pnl, trades):
+    # Heatmap calendrier : une colonne par semaine (lundi), une ligne par jour, cases vides
+    # sans trade. days : jours tradés datetime64[D] triés, pnl / trades alignés sur days
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 était un jeudi
+    first_monday = days[0] - np.timedelta64(int(weekday[0]), 'D')
+    week = (days - first_monday).astype(np.int64) // 7
+    n_weeks = int(week[-1]) + 1
+    z = np.full((7, n_weeks), np.nan)
+    z[weekday, week] = pnl
+    counts = np.zeros((7, n_weeks), dtype=np.int64)
+    counts[weekday, week] = trades
+    cell_days = first_monday + np.arange(n_weeks * 7).reshape(n_weeks, 7).T.astype('timedelta64[D]')
+    fig = go.Figure(go.Heatmap(
+        x=first_monday + (np.arange(n_weeks) * 7).astype('timedelta64[D]'),
+        y=WEEKDAY_SHORT,
+        z=z,
+        customdata=np.dstack([cell_days.astype(str), counts]),
+        hovertemplate="%{customdata[0]}<br>P&L : %{z:+.2f} €<br>%{customdata[1]} trade(s)<extra></extra>",
+        colorscale=PNL_COLORSCALE, zmid=0, xgap=2, ygap=2, hoverongaps=False
+    ))
+    fig.update_layout(height=260, yaxis=dict(autorange='reversed'), **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.monthly")
+def monthly_figure(month_stats):
+    # Heatmap année x mois du P&L ; month_stats : time_buckets(...)['month']
+    years = month_stats.index.year.to_numpy()
+    year_labels = np.unique(years)
+    z = np.full((len(year_labels), 12), np.nan)
+    z[np.searchsorted(year_labels, years), month_stats.index.month.to_numpy() - 1] = month_stats['pnl'].to_numpy()
+    fig = go.Figure(go.Heatmap(
+        x=MONTH_SHORT, y=[str(year) for year in year_labels], z=z,
+        text=np.where(np.isnan(z), "", np.char.mod("%+.0f", np.nan_to_num(z))), texttemplate="%{text}",
+        hovertemplate="%{x} %{y}<br>P&L : %{z:+.2f} €<extra></extra>",
+        colorscale=PNL_COLORSCALE, zmid=0, xgap=2, ygap=2, hoverongaps=False
+    ))
+    fig.update_layout(height=120 + 40 * len(year_labels), yaxis=dict(autorange='reversed', type='category'),
+                      **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.time_buckets")
+def time_bucket_figure(bucket_stats, xaxis_title: str):
+    # P&L par intervalle (jour de la semaine, heure, session), winrate au survol
+    pnl = bucket_stats['pnl'].to_numpy()
+    fig = go.Figure(go.Bar(
+        x=[str(label) for label in bucket_stats.index],
+        y=pnl,
+        marker=dict(color=np.where(pnl >= 0, '#92fe9d', '#ff6b6b')),
+        customdata=np.column_stack([bucket_stats['trades'], bucket_stats['winrate'], bucket_stats['expectancy']]),
+        hovertemplate="%{x}<br>P&L : %{y:+.2f} €<br>%{customdata[0]} trade(s), winrate %{customdata[1]:.1f}%"
+                      "<br>Expectancy : %{customdata[2]:+.2f} €<extra></extra>"
+    ))
+    fig.update_layout(height=350, xaxis_title=xaxis_title, yaxis_title="P&L (€)", xaxis=dict(type='category'),
+                      **DARK_LAYOUT)
+    return fig
+
+
+@timed("chart.monte_carlo")
+def monte_carlo_figure(simulation, percentiles, start_capital: float, ruin_level: float):
+    # Courbe en éventail : bandes extrêmes puis intérieures (percentiles triés), médiane
+    fan = simulation['fan']
+    steps = simulation['fan_steps']
+    fig = go.Figure()
+    for low, high, opacity in ((percentiles[0], percentiles[-1], 0.15), (percentiles[1], percentiles[-2], 0.3)):
+        fig.add_trace(go.Scatter(x=steps, y=fan[high], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=steps, y=fan[low], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f'rgba(0, 201, 255, {opacity})', name=f"p{low} – p{high}"))
+    fig.add_trace(go.Scatter(x=steps, y=fan[50], mode='lines', name="Médiane", line=dict(color='#92fe9d', width=3)))
+    fig.add_hline(y=start_capital, line_dash="dash", line_color="#8b92a7", annotation_text="Capital")
+    fig.add_hline(y=ruin_level, line_dash="dot", line_color="#ff6b6b", annotation_text="Ruine")
+    fig.update_layout(height=450, xaxis_title="Trades", yaxis_title="Equity (€)", hovermode='x unified', **DARK_LAYOUT)
+    return fig
+
+
+# ============================================
+# CACHE DE FIGURES SÉRIALISÉES
+# ============================================
+def figure_from_json(spec: str):
+    # JSON produit par Plotly lui-même : pas de revalidation (le gros du coût de construction)
+    return go.Figure(json.loads(spec), _validate=False)
+
+
+class FigureCache:
+    # LRU de figures sérialisées (JSON Plotly), partagé entre les sessions du process,
+    # borné en nombre d'entrées et en taille totale. La clé doit contenir l'utilisateur,
+    # la version du jeu de trades et tous les paramètres d'affichage : une entrée n'est
+    # jamais invalidée, elle devient inaccessible puis sort par éviction LRU.
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is not None:
+                self._entries.move_to_end(key)
+        if spec is not None:
+            METRICS.increment('figure_cache_hit')
+            return figure_from_json(spec)
+        METRICS.increment('figure_cache_miss')
+        fig = build()
+        self.put(key, pio.to_json(fig, validate=False))
+        return fig
+
+    def put(self, key, spec: str):
+        # Taille comptée en caractères (JSON quasi ASCII : ~1 octet par caractère)
+        if len(spec) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = spec
+            self._bytes += len(spec)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
@@ -0,0 +1,83 @@
+-- ========================================
+-- VUES D'AGRÉGATION POUR L'ONGLET ANALYTICS
+-- ========================================
+-- Copiez-collez ce fichier dans Supabase SQL Editor (après create_table.sql
+-- et create_users_table.sql), puis lancez l'app avec ANALYTICS_SOURCE=server.
+-- L'onglet Analytics lit alors ces agrégats au lieu des trades bruts :
+-- la taille des réponses ne dépend plus de la taille de l'historique.
+
+-- Statistiques par (actif, direction) : base de tous les KPIs de l'app
+-- (les totaux par actif, par direction et globaux en sont déduits)
+CREATE OR REPLACE VIEW trades_group_stats
+WITH (security_invoker = true) AS
+SELECT
+    user_email,
+    pair,
+    direction,
+    COUNT(*)                                        AS trades,
+    COUNT(*) FILTER (WHERE result > 0)              AS wins,
+    COUNT(*) FILTER (WHERE result < 0)              AS losers,
+    SUM(result)::DOUBLE PRECISION                   AS pnl,
+    COALESCE(SUM(result) FILTER (WHERE result > 0), 0)::DOUBLE PRECISION AS gains,
+    COALESCE(SUM(result) FILTER (WHERE result < 0), 0)::DOUBLE PRECISION AS losses,
+    MAX(result)::DOUBLE PRECISION                   AS biggest_win,
+    MIN(result)::DOUBLE PRECISION                   AS biggest_loss
+FROM trades
+GROUP BY user_email, pair, direction;
+
+-- Nombre de trades et P&L par actif
+CREATE OR REPLACE VIEW trades_pair_stats
+WITH (security_invoker = true) AS
+SELECT user_email, pair, SUM(trades) AS trades, SUM(wins) AS wins, SUM(pnl) AS pnl
+FROM trades_group_stats
+GROUP BY user_email, pair;
+
+-- Statistiques Long / Short
+CREATE OR REPLACE VIEW trades_direction_stats
+WITH (security_invoker = true) AS
+SELECT user_email, direction, SUM(trades) AS trades, SUM(wins) AS wins, SUM(losers) AS losers,
+       SUM(pnl) AS pnl, SUM(gains) AS gains, SUM(losses) AS losses
+FROM trades_group_stats
+GROUP BY user_email, direction;
+
+-- P&L journalier
+CREATE OR REPLACE VIEW trades_daily_pnl
+WITH (security_invoker = true) AS
+SELECT user_email, date, COUNT(*) AS trades, SUM(result)::DOUBLE PRECISION AS pnl
+FROM trades
+GROUP BY user_email, date;
+
+-- Histogramme des résultats : p_bins intervalles égaux entre le min et le max
+-- (mêmes bornes que numpy.histogram, dernier intervalle fermé).
+-- Seuls les intervalles non vides sont renvoyés.
+CREATE OR REPLACE FUNCTION trades_result_histogram(p_user_email TEXT, p_bins INT DEFAULT 20)
+RETURNS TABLE (bucket INT, lower_bound DOUBLE PRECISION, upper_bound DOUBLE PRECISION, trades BIGINT)
+LANGUAGE sql STABLE SECURITY INVOKER AS $$
+    WITH bounds AS (
+        SELECT
+            CASE WHEN MAX(result) > MIN(result) THEN MIN(result) ELSE MIN(result) - 0.5 END::DOUBLE PRECISION AS lo,
+            CASE WHEN MAX(result) > MIN(result) THEN MAX(result) ELSE MAX(result) + 0.5 END::DOUBLE PRECISION AS hi
+        FROM trades
+        WHERE user_email = p_user_email
+    )
+    SELECT
+        b.bucket,
+        bounds.lo + (b.bucket - 1) * (bounds.hi - bounds.lo) / p_bins,
+        bounds.lo + b.bucket * (bounds.hi - bounds.lo) / p_bins,
+        b.trades
+    FROM (
+        SELECT LEAST(width_bucket(t.result::DOUBLE PRECISION, bounds.lo, bounds.hi, p_bins), p_bins) AS bucket,
+               COUNT(*) AS trades
+        FROM trades t, bounds
+        WHERE t.user_email = p_user_email
+        GROUP BY 1
+    ) b, bounds
+    ORDER BY b.bucket;
+$$;
+
+GRANT SELECT ON trades_group_stats, trades_pair_stats, trades_direction_stats, trades_daily_pnl TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION trades_result_histogram(TEXT, INT) TO anon, authenticated;
+
+-- ========================================
+-- FIN DU SCRIPT
+-- ========================================
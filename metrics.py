@@ -0,0 +1,154 @@
+# ============================================
+# MÉTRIQUES : LATENCES, COMPTEURS, PROFIL PAR RERUN
+# ============================================
+# Module sans Streamlit. METRICS est le registre du process : fenêtre glissante
+# pour les percentiles du panneau admin, histogrammes cumulés pour l'export
+# Prometheus. Chaque mesure faite dans un thread de session pendant un rerun est
+# aussi ajoutée au profil de ce rerun (start_profile / finish_profile).
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes (s) des histogrammes Prometheus ; +Inf est implicite
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyStats:
+    # Dernières mesures par nom d'opération (fenêtre glissante), histogrammes et compteurs cumulés
+    def __init__(self, window: int = 1000, buckets=HISTOGRAM_BUCKETS):
+        self._samples = {}
+        self._histograms = {}
+        self._counters = {}
+        self._window = window
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self._window)).append(seconds)
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {'buckets': [0] * (len(self._buckets) + 1), 'sum': 0.0}
+            histogram['buckets'][bisect.bisect_left(self._buckets, seconds)] += 1
+            histogram['sum'] += seconds
+        profile = getattr(self._local, 'profile', None)
+        if profile is not None:
+            profile.append((name, seconds))
+
+    def increment(self, name: str):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        # Décorateur : chaque appel (exceptions comprises) est mesuré sous ce nom
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        # {'latency': {nom: {count, p50_ms, p95_ms, max_ms}}, 'counters': {nom: n}}
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counters = dict(self._counters)
+        latency = {}
+        for name, values in samples.items():
+            if values:
+                latency[name] = {'count': len(values),
+                                 'p50_ms': values[len(values) // 2] * 1000,
+                                 'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+                                 'max_ms': values[-1] * 1000}
+        return {'latency': latency, 'counters': counters}
+
+    # ---------- Profil du rerun (thread courant) ----------
+    def start_profile(self):
+        self._local.profile = []
+        self._local.started = time.perf_counter()
+
+    def finish_profile(self, name: str = 'rerun'):
+        # Arrête la collecte ; renvoie (durée totale en s, [(opération, s)]) ou None si rien n'était collecté
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return None
+        self._local.profile = None
+        total = time.perf_counter() - self._local.started
+        self.record(name, total)
+        return total, profile
+
+    # ---------- Export ----------
+    def prometheus_text(self, prefix: str = "tradeflow"):
+        # Format d'exposition texte de Prometheus (version 0.0.4)
+        with self._lock:
+            histograms = {name: (list(h['buckets']), h['sum']) for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = [f"# HELP {prefix}_operation_seconds Durée des opérations instrumentées",
+                 f"# TYPE {prefix}_operation_seconds histogram"]
+        for name, (buckets, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (None,), buckets):
+                cumulative += count
+                le = "+Inf" if bound is None else repr(bound)
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_operation_seconds_sum{{operation="{name}"}} {total!r}')
+            lines.append(f'{prefix}_operation_seconds_count{{operation="{name}"}} {cumulative}')
+        lines += [f"# HELP {prefix}_events_total Événements comptés",
+                  f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{event="{name}"}} {count}' for name, count in sorted(counters.items())]
+        return "\n".join(lines) + "\n"
+
+
+def profile_summary(total: float, profile):
+    # Agrège un profil de rerun par opération, de la plus coûteuse à la moins coûteuse.
+    # Les opérations imbriquées (ex. db.* dans trades.load) se recouvrent : la somme dépasse le total.
+    operations = {}
+    for name, seconds in profile:
+        count, elapsed = operations.get(name, (0, 0.0))
+        operations[name] = (count + 1, elapsed + seconds)
+    return {'total_ms': total * 1000,
+            'operations': [{'operation': name, 'count': count, 'total_ms': elapsed * 1000,
+                            'share_pct': elapsed / total * 100 if total > 0 else 0.0}
+                           for name, (count, elapsed) in sorted(operations.items(), key=lambda item: -item[1][1])]}
+
+
+def start_metrics_server(stats: LatencyStats, port: int, host: str = "127.0.0.1"):
+    # Sert GET /metrics (texte Prometheus) dans un thread démon ; renvoie le serveur
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = stats.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="tradeflow-metrics").start()
+    return server
+
+
+# Registre partagé par tout le process (app, auth, stockage, graphiques)
+METRICS = LatencyStats()
+timer = METRICS.timer
+timed = METRICS.timed
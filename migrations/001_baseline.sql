@@ -0,0 +1,42 @@
+-- ========================================
+-- 001 : SCHÉMA INITIAL (create_table.sql + create_users_table.sql)
+-- ========================================
+-- Idempotent : sans effet sur une base déjà créée avec les scripts historiques.
+
+CREATE TABLE IF NOT EXISTS trades (
+    id BIGSERIAL PRIMARY KEY,
+    date TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    entry_price REAL,
+    exit_price REAL,
+    lots REAL,
+    result REAL NOT NULL,
+    timestamp TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id BIGSERIAL PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    full_name TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS user_email TEXT;
+
+ALTER TABLE trades ENABLE ROW LEVEL SECURITY;
+ALTER TABLE users ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable all for anon" ON trades;
+DROP POLICY IF EXISTS "Enable all for authenticated" ON trades;
+CREATE POLICY "Enable all for anon" ON trades FOR ALL TO anon USING (true) WITH CHECK (true);
+CREATE POLICY "Enable all for authenticated" ON trades FOR ALL TO authenticated USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Enable all for anon" ON users;
+DROP POLICY IF EXISTS "Enable all for authenticated" ON users;
+CREATE POLICY "Enable all for anon" ON users FOR ALL TO anon USING (true) WITH CHECK (true);
+CREATE POLICY "Enable all for authenticated" ON users FOR ALL TO authenticated USING (true) WITH CHECK (true);
+
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_trades_user_email ON trades(user_email);
@@ -0,0 +1,56 @@
+-- ========================================
+-- 002 : TYPES DES COLONNES DE TRADES
+-- ========================================
+-- date TEXT -> DATE : tri et comparaisons sur 4 octets au lieu de chaînes.
+-- REAL -> DOUBLE PRECISION : plus d'arrondi à 7 chiffres sur les prix (BTC, indices)
+-- ni sur les sommes de P&L. Le passage par NUMERIC garde la valeur affichée
+-- (65432.12 et non 65432.1171875).
+-- Les vues d'agrégation dépendent de ces colonnes : supprimées puis recréées
+-- à l'identique (create_analytics_views.sql) dans la même transaction.
+
+DROP VIEW IF EXISTS trades_pair_stats, trades_direction_stats, trades_daily_pnl, trades_group_stats;
+
+ALTER TABLE trades
+    ALTER COLUMN date TYPE DATE USING LEFT(date, 10)::DATE,
+    ALTER COLUMN entry_price TYPE DOUBLE PRECISION USING entry_price::NUMERIC::DOUBLE PRECISION,
+    ALTER COLUMN exit_price TYPE DOUBLE PRECISION USING exit_price::NUMERIC::DOUBLE PRECISION,
+    ALTER COLUMN lots TYPE DOUBLE PRECISION USING lots::NUMERIC::DOUBLE PRECISION,
+    ALTER COLUMN result TYPE DOUBLE PRECISION USING result::NUMERIC::DOUBLE PRECISION;
+
+CREATE VIEW trades_group_stats
+WITH (security_invoker = true) AS
+SELECT
+    user_email,
+    pair,
+    direction,
+    COUNT(*)                                        AS trades,
+    COUNT(*) FILTER (WHERE result > 0)              AS wins,
+    COUNT(*) FILTER (WHERE result < 0)              AS losers,
+    SUM(result)::DOUBLE PRECISION                   AS pnl,
+    COALESCE(SUM(result) FILTER (WHERE result > 0), 0)::DOUBLE PRECISION AS gains,
+    COALESCE(SUM(result) FILTER (WHERE result < 0), 0)::DOUBLE PRECISION AS losses,
+    MAX(result)::DOUBLE PRECISION                   AS biggest_win,
+    MIN(result)::DOUBLE PRECISION                   AS biggest_loss
+FROM trades
+GROUP BY user_email, pair, direction;
+
+CREATE VIEW trades_pair_stats
+WITH (security_invoker = true) AS
+SELECT user_email, pair, SUM(trades) AS trades, SUM(wins) AS wins, SUM(pnl) AS pnl
+FROM trades_group_stats
+GROUP BY user_email, pair;
+
+CREATE VIEW trades_direction_stats
+WITH (security_invoker = true) AS
+SELECT user_email, direction, SUM(trades) AS trades, SUM(wins) AS wins, SUM(losers) AS losers,
+       SUM(pnl) AS pnl, SUM(gains) AS gains, SUM(losses) AS losses
+FROM trades_group_stats
+GROUP BY user_email, direction;
+
+CREATE VIEW trades_daily_pnl
+WITH (security_invoker = true) AS
+SELECT user_email, date, COUNT(*) AS trades, SUM(result)::DOUBLE PRECISION AS pnl
+FROM trades
+GROUP BY user_email, date;
+
+GRANT SELECT ON trades_group_stats, trades_pair_stats, trades_direction_stats, trades_daily_pnl TO anon, authenticated;
@@ -0,0 +1,18 @@
+-- ========================================
+-- 003 : INDEX COMPOSITES SUR TRADES
+-- ========================================
+-- Journal : WHERE user_email = ? ORDER BY date DESC, id DESC LIMIT n (+ curseur keyset).
+-- INCLUDE couvre toutes les colonnes lues par une page : parcours d'index seul,
+-- sans accès à la table (dès que l'autovacuum a mis à jour la visibility map).
+CREATE INDEX IF NOT EXISTS idx_trades_user_date_id
+    ON trades (user_email, date DESC, id DESC)
+    INCLUDE (pair, direction, entry_price, exit_price, lots, result);
+
+-- Synchro incrémentale et export : WHERE user_email = ? AND id > ? ORDER BY id
+CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades (user_email, id);
+
+-- Redondants : préfixe des index ci-dessus, doublon de la contrainte UNIQUE(email)
+DROP INDEX IF EXISTS idx_trades_user_email;
+DROP INDEX IF EXISTS idx_users_email;
+
+ANALYZE trades;
@@ -0,0 +1,22 @@
+-- ========================================
+-- 004 : CLÉ ÉTRANGÈRE TRADES -> USERS
+-- ========================================
+-- Ajoutée NOT VALID (aucun scan de la table, verrou bref) puis validée.
+-- S'il reste des trades orphelins, la contrainte reste NOT VALID : elle s'applique
+-- aux nouvelles lignes, et se valide plus tard après nettoyage avec
+--   ALTER TABLE trades VALIDATE CONSTRAINT trades_user_email_fkey;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'trades_user_email_fkey') THEN
+        ALTER TABLE trades ADD CONSTRAINT trades_user_email_fkey
+            FOREIGN KEY (user_email) REFERENCES users(email)
+            ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    ALTER TABLE trades VALIDATE CONSTRAINT trades_user_email_fkey;
+EXCEPTION WHEN foreign_key_violation THEN
+    RAISE NOTICE 'Trades orphelins : trades_user_email_fkey laissée NOT VALID';
+END $$;
@@ -0,0 +1,39 @@
+-- ========================================
+-- 005 : COMPTES BROKER (PLUSIEURS PAR UTILISATEUR)
+-- ========================================
+-- Chaque utilisateur a un ou plusieurs comptes, avec leur capital persisté
+-- (auparavant remis à 733.18 / 500 à chaque session). Les trades portent le
+-- compte dans account_id. L'historique existant est rattaché à un compte
+-- "Compte principal" créé pour chaque utilisateur.
+CREATE TABLE IF NOT EXISTS accounts (
+    id BIGSERIAL PRIMARY KEY,
+    user_email TEXT NOT NULL REFERENCES users(email) ON UPDATE CASCADE ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    capital_reel DOUBLE PRECISION NOT NULL DEFAULT 733.18,
+    credit_broker DOUBLE PRECISION NOT NULL DEFAULT 500,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (user_email, name)
+);
+
+ALTER TABLE accounts ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Enable all for anon" ON accounts;
+DROP POLICY IF EXISTS "Enable all for authenticated" ON accounts;
+CREATE POLICY "Enable all for anon" ON accounts FOR ALL TO anon USING (true) WITH CHECK (true);
+CREATE POLICY "Enable all for authenticated" ON accounts FOR ALL TO authenticated USING (true) WITH CHECK (true);
+
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS account_id BIGINT REFERENCES accounts(id) ON DELETE CASCADE;
+
+INSERT INTO accounts (user_email, name)
+SELECT email, 'Compte principal' FROM users
+ON CONFLICT (user_email, name) DO NOTHING;
+
+-- Trades orphelins (utilisateur supprimé, cf. 004) : laissés sans compte
+UPDATE trades t
+SET account_id = a.id
+FROM accounts a
+WHERE t.account_id IS NULL AND a.user_email = t.user_email AND a.name = 'Compte principal';
+
+-- Chargement par compte (en parallèle) : WHERE account_id = ? AND id > ? ORDER BY id
+CREATE INDEX IF NOT EXISTS idx_trades_account_id ON trades (account_id, id);
+
+ANALYZE trades;
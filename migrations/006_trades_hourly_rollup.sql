@@ -0,0 +1,107 @@
+-- ========================================
+-- 006 : ROLLUP PAR JOUR ET HEURE (ANALYSE TEMPORELLE)
+-- ========================================
+-- Une ligne par (utilisateur, jour, heure UTC du timestamp) : nombre de trades,
+-- gagnants, perdants, P&L, gains et pertes. Jours, mois, jours de la semaine,
+-- heures et sessions en sont déduits côté app : quelques milliers de lignes
+-- sur des années d'historique, au lieu de relire tous les trades.
+-- Tenue à jour par triggers FOR EACH STATEMENT (tables de transition) : un
+-- import de 10 000 trades fait un seul upsert agrégé, pas 10 000.
+-- hour = -1 : trade sans timestamp.
+CREATE TABLE IF NOT EXISTS trades_hourly_rollup (
+    user_email TEXT NOT NULL,
+    date DATE NOT NULL,
+    hour SMALLINT NOT NULL,
+    trades INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losers INTEGER NOT NULL,
+    pnl DOUBLE PRECISION NOT NULL,
+    gains DOUBLE PRECISION NOT NULL,
+    losses DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (user_email, date, hour)
+);
+
+-- Écrite uniquement par les triggers (SECURITY DEFINER) : lecture seule pour les clients
+ALTER TABLE trades_hourly_rollup ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Enable read for anon" ON trades_hourly_rollup;
+DROP POLICY IF EXISTS "Enable read for authenticated" ON trades_hourly_rollup;
+CREATE POLICY "Enable read for anon" ON trades_hourly_rollup FOR SELECT TO anon USING (true);
+CREATE POLICY "Enable read for authenticated" ON trades_hourly_rollup FOR SELECT TO authenticated USING (true);
+GRANT SELECT ON trades_hourly_rollup TO anon, authenticated;
+
+-- Ajoute (p_sign = 1) ou retire (p_sign = -1) la contribution de lignes de trades
+-- (table de transition passée en JSON : une fonction SQL ne peut pas la lire
+-- directement). Les clés sont verrouillées dans l'ordre (ORDER BY) : deux écritures
+-- concurrentes sur les mêmes heures ne peuvent pas s'interbloquer.
+CREATE OR REPLACE FUNCTION trades_rollup_apply(p_sign INT, p_rows JSONB)
+RETURNS VOID LANGUAGE sql AS $$
+    INSERT INTO trades_hourly_rollup AS r (user_email, date, hour, trades, wins, losers, pnl, gains, losses)
+    SELECT user_email, date, hour,
+           p_sign * COUNT(*),
+           p_sign * COUNT(*) FILTER (WHERE result > 0),
+           p_sign * COUNT(*) FILTER (WHERE result < 0),
+           p_sign * SUM(result),
+           p_sign * COALESCE(SUM(result) FILTER (WHERE result > 0), 0),
+           p_sign * COALESCE(SUM(result) FILTER (WHERE result < 0), 0)
+    FROM (
+        SELECT t.user_email, t.date,
+               COALESCE(EXTRACT(HOUR FROM t.timestamp AT TIME ZONE 'UTC'), -1)::SMALLINT AS hour, t.result
+        FROM jsonb_populate_recordset(NULL::trades, p_rows) t
+        WHERE t.user_email IS NOT NULL
+    ) contributions
+    GROUP BY user_email, date, hour
+    ORDER BY user_email, date, hour
+    ON CONFLICT (user_email, date, hour) DO UPDATE SET
+        trades = r.trades + EXCLUDED.trades,
+        wins = r.wins + EXCLUDED.wins,
+        losers = r.losers + EXCLUDED.losers,
+        pnl = r.pnl + EXCLUDED.pnl,
+        gains = r.gains + EXCLUDED.gains,
+        losses = r.losses + EXCLUDED.losses;
+$$;
+-- Interne aux triggers : pas d'appel RPC depuis les clients
+REVOKE EXECUTE ON FUNCTION trades_rollup_apply(INT, JSONB) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION trades_rollup_sync()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    -- old_rows / new_rows n'existent que pour les opérations qui les déclarent :
+    -- chaque branche n'est planifiée qu'à sa première exécution
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM trades_rollup_apply(-1, (SELECT jsonb_agg(o) FROM old_rows o));
+        DELETE FROM trades_hourly_rollup r
+        USING (SELECT DISTINCT user_email FROM old_rows) u
+        WHERE r.user_email = u.user_email AND r.trades <= 0;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM trades_rollup_apply(1, (SELECT jsonb_agg(n) FROM new_rows n));
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trades_rollup_insert ON trades;
+DROP TRIGGER IF EXISTS trades_rollup_update ON trades;
+DROP TRIGGER IF EXISTS trades_rollup_delete ON trades;
+CREATE TRIGGER trades_rollup_insert AFTER INSERT ON trades
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION trades_rollup_sync();
+CREATE TRIGGER trades_rollup_update AFTER UPDATE ON trades
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION trades_rollup_sync();
+CREATE TRIGGER trades_rollup_delete AFTER DELETE ON trades
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION trades_rollup_sync();
+
+-- Rattrapage de l'historique. CREATE TRIGGER a pris un verrou bloquant les écritures
+-- sur trades jusqu'à la fin de la transaction : aucun trade n'est compté deux fois ni oublié.
+TRUNCATE trades_hourly_rollup;
+INSERT INTO trades_hourly_rollup (user_email, date, hour, trades, wins, losers, pnl, gains, losses)
+SELECT user_email, date, COALESCE(EXTRACT(HOUR FROM timestamp AT TIME ZONE 'UTC'), -1)::SMALLINT,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE result > 0),
+       COUNT(*) FILTER (WHERE result < 0),
+       SUM(result),
+       COALESCE(SUM(result) FILTER (WHERE result > 0), 0),
+       COALESCE(SUM(result) FILTER (WHERE result < 0), 0)
+FROM trades
+WHERE user_email IS NOT NULL
+GROUP BY 1, 2, 3;
+
+ANALYZE trades_hourly_rollup;
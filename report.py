@@ -0,0 +1,155 @@
+# ============================================
+# RAPPORTS EN LOT (SANS STREAMLIT)
+# ============================================
+# KPIs et métriques de risque de chaque compte, calculés en parallèle (un process
+# par worker) depuis la base configurée comme pour l'app, ou depuis des exports CSV.
+#
+#   TRADEFLOW_STORAGE=sqlite python report.py                 # tous les comptes
+#   python report.py --users a@x.com,b@y.com --format jsonl   # comptes choisis
+#   python report.py --csv exports/*.csv -o rapport.csv       # un compte par fichier
+#                                                             # (ou par user_email)
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from analytics import TRADE_FRAME_COLUMNS, trade_report, typed_trades
+
+# Même capital par défaut que le "Capital Réel" de l'app (base des drawdowns en %)
+DEFAULT_CAPITAL = 733.18
+# Colonnes du rapport CSV (le format jsonl garde aussi les détails par actif/direction)
+REPORT_FIELDS = ['account', 'total_trades', 'total_pnl', 'winrate', 'profit_factor', 'avg_win', 'avg_loss',
+                 'biggest_win', 'biggest_loss', 'max_drawdown', 'max_drawdown_pct', 'current_drawdown_pct',
+                 'longest_drawdown_days', 'sharpe', 'sortino', 'expectancy', 'expectancy_r',
+                 'longest_win_streak', 'longest_loss_streak', 'current_streak']
+
+_storage = None
+
+
+def open_storage():
+    # Même configuration que l'app : variables d'environnement, puis .streamlit/secrets.toml
+    from storage import SQLiteStorage, SupabaseStorage
+    if os.getenv("TRADEFLOW_STORAGE", "supabase") == "sqlite":
+        return SQLiteStorage(os.getenv("TRADEFLOW_SQLITE_PATH", "tradeflow.db"))
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    secrets_path = Path(__file__).resolve().parent / ".streamlit" / "secrets.toml"
+    if not (url and key) and secrets_path.exists():
+        import tomllib
+        secrets = tomllib.loads(secrets_path.read_text(encoding='utf-8')).get("supabase", {})
+        url, key = url or secrets.get("url"), key or secrets.get("key")
+    if not (url and key):
+        sys.exit("❌ SUPABASE_URL / SUPABASE_KEY manquantes (ou TRADEFLOW_STORAGE=sqlite)")
+    return SupabaseStorage(url, key)
+
+
+def _init_worker():
+    # Une connexion par process worker (jamais partagée à travers un fork)
+    global _storage
+    _storage = open_storage()
+
+
+def load_user_trades(storage, user_email):
+    rows = [row for page in storage.iter_trade_pages(user_email, columns=",".join(TRADE_FRAME_COLUMNS))
+            for row in page]
+    return typed_trades(pd.DataFrame(rows, columns=TRADE_FRAME_COLUMNS))
+
+
+def report_user(user_email, capital: float):
+    return [(user_email, trade_report(load_user_trades(_storage, user_email), capital))]
+
+
+def report_csv(path, capital: float):
+    # Export TradeFlow : un compte par fichier, ou par user_email si la colonne existe
+    trades = pd.read_csv(path)
+    if 'user_email' in trades.columns:
+        groups = trades.groupby('user_email', sort=True)
+    else:
+        groups = [(Path(path).stem, trades)]
+    return [(account, trade_report(typed_trades(df), capital)) for account, df in groups]
+
+
+def flatten(account, report):
+    row = {'account': account, **report['kpis'], **(report['risk'] or {})}
+    return {field: row.get(field) for field in REPORT_FIELDS}
+
+
+def run_reports(task, items, capital: float, workers: int, initializer=None):
+    # Renvoie ([(compte, rapport)], [(élément, erreur)]) ; un compte en échec n'arrête pas le lot
+    reports, errors = [], []
+    if workers <= 1:
+        if initializer:
+            initializer()
+        for item in items:
+            try:
+                reports.extend(task(item, capital))
+            except Exception as e:
+                errors.append((item, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+            futures = {executor.submit(task, item, capital): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    reports.extend(future.result())
+                except Exception as e:
+                    errors.append((futures[future], e))
+    return sorted(reports, key=lambda pair: pair[0]), errors
+
+
+def write_reports(reports, output, report_format: str):
+    if report_format == "jsonl":
+        for account, report in reports:
+            output.write(json.dumps({'account': account, **report}, ensure_ascii=False) + "\n")
+    else:
+        writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(flatten(account, report) for account, report in reports)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapports KPI / risque de TradeFlow pour plusieurs comptes")
+    parser.add_argument("--users", help="emails séparés par des virgules (défaut : tous les comptes de la base)")
+    parser.add_argument("--csv", nargs="+", metavar="FICHIER", help="exports CSV à analyser au lieu de la base")
+    parser.add_argument("--capital", type=float, default=DEFAULT_CAPITAL,
+                        help=f"capital de départ pour les drawdowns en %% (défaut : {DEFAULT_CAPITAL})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process en parallèle")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", dest="report_format")
+    parser.add_argument("-o", "--output", help="fichier de sortie (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.csv:
+        reports, errors = run_reports(report_csv, args.csv, args.capital, args.workers)
+    else:
+        stored = open_storage().list_user_emails()
+        if args.users:
+            # user_email est sensible à la casse en base : on retrouve l'email tel qu'enregistré
+            # (correspondance exacte d'abord, sinon sans tenir compte de la casse)
+            by_lower = {email.lower(): email for email in stored}
+            exact = set(stored)
+            emails = [email if email in exact else by_lower.get(email.lower(), email)
+                      for email in (email.strip() for email in args.users.split(",")) if email]
+        else:
+            emails = stored
+        reports, errors = run_reports(report_user, emails, args.capital, args.workers, initializer=_init_worker)
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as output:
+            write_reports(reports, output, args.report_format)
+    else:
+        write_reports(reports, sys.stdout, args.report_format)
+
+    for item, error in errors:
+        print(f"❌ {item} : {error}", file=sys.stderr)
+    print(f"✅ {len(reports)} compte(s) en {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# ============================================
+# MONTE CARLO : RISQUE DE RUINE PAR BOOTSTRAP
+# ============================================
+# Module sans Streamlit : rééchantillonne l'historique des résultats en milliers
+# de trajectoires d'equity futures. Tout est vectorisé par blocs de trajectoires
+# (mémoire bornée) ; au-delà de quelques dizaines de milliers de trajectoires,
+# les blocs sont répartis sur un pool de workers (threads par défaut).
+import hashlib
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+FAN_PERCENTILES = (5, 25, 50, 75, 95)
+DRAWDOWN_PERCENTILES = (50, 75, 90, 95, 99)
+# Points de la courbe en éventail (les percentiles sont calculés à ces instants)
+FAN_POINTS = 100
+# Trajectoires simulées par bloc NumPy : blocs de ~16 Mo pour un horizon de 1000 trades
+SIMULATION_BLOCK = 2_000
+
+
+def trades_fingerprint(results) -> str:
+    # Empreinte du jeu de trades, indépendante de l'ordre : clé de cache et graine aléatoire
+    return hashlib.sha256(np.sort(np.asarray(results, dtype=np.float64)).tobytes()).hexdigest()
+
+
+def r_unit(results) -> float:
+    # 1R = perte moyenne (même définition que les métriques de risque)
+    losses = results[results < 0]
+    return float(-losses.mean()) if len(losses) else 0.0
+
+
+def fan_steps(horizon: int):
+    return np.unique(np.linspace(0, horizon, min(FAN_POINTS, horizon) + 1).round().astype(np.int64))
+
+
+def simulate_paths(samples, n_paths: int, horizon: int, start_capital: float, mode: str,
+                   risk_pct: float, ruin_level: float, seed):
+    # samples : résultats en € (mode "eur", cumul additif) ou multiples de R
+    # (mode "r" : chaque trade risque risk_pct % de l'equity courante, cumul composé).
+    # Renvoie, par trajectoire : equity finale, drawdown max (%), ruine, et l'equity
+    # aux instants fan_steps(horizon) pour la courbe en éventail.
+    rng = np.random.default_rng(seed)
+    steps = fan_steps(horizon)
+    final = np.empty(n_paths)
+    max_drawdown = np.empty(n_paths)
+    ruined = np.empty(n_paths, dtype=bool)
+    fan = np.empty((n_paths, len(steps)), dtype=np.float32)
+
+    for start in range(0, n_paths, SIMULATION_BLOCK):
+        stop = min(start + SIMULATION_BLOCK, n_paths)
+        draws = samples[rng.integers(0, len(samples), size=(stop - start, horizon))]
+        equity = np.empty((stop - start, horizon + 1))
+        equity[:, 0] = start_capital
+        if mode == "r":
+            # Un trade ne peut pas faire perdre plus que l'equity restante
+            np.cumprod(np.maximum(1.0 + draws * (risk_pct / 100), 0.0), axis=1, out=equity[:, 1:])
+            equity[:, 1:] *= start_capital
+        else:
+            np.cumsum(draws, axis=1, out=equity[:, 1:])
+            equity[:, 1:] += start_capital
+
+        peak = np.maximum.accumulate(equity, axis=1)
+        drawdown = np.divide(peak - equity, peak, out=np.ones_like(equity), where=peak > 0)
+        final[start:stop] = equity[:, -1]
+        max_drawdown[start:stop] = drawdown.max(axis=1) * 100
+        ruined[start:stop] = equity.min(axis=1) <= ruin_level
+        fan[start:stop] = equity[:, steps]
+
+    return {'final': final, 'max_drawdown': max_drawdown, 'ruined': ruined, 'fan': fan}
+
+
+def _summarize(paths, horizon: int, start_capital: float):
+    fan = np.percentile(paths['fan'], FAN_PERCENTILES, axis=0)
+    return {
+        'n_paths': len(paths['final']),
+        'risk_of_ruin': float(paths['ruined'].mean() * 100),
+        'prob_loss': float((paths['final'] < start_capital).mean() * 100),
+        'final_percentiles': dict(zip(FAN_PERCENTILES, np.percentile(paths['final'], FAN_PERCENTILES).tolist())),
+        'drawdown_percentiles': dict(zip(DRAWDOWN_PERCENTILES,
+                                         np.percentile(paths['max_drawdown'], DRAWDOWN_PERCENTILES).tolist())),
+        'fan_steps': fan_steps(horizon).tolist(),
+        'fan': {p: row.tolist() for p, row in zip(FAN_PERCENTILES, fan)},
+    }
+
+
+def run_monte_carlo(results, n_paths: int, horizon: int, start_capital: float, mode: str = "eur",
+                    risk_pct: float = 1.0, ruin_pct: float = 50.0, executor=None, workers: int = 1,
+                    parallel_min_paths: int = 20_000):
+    # ruin_pct : perte (en % du capital de départ) considérée comme la ruine.
+    # Résultat déterministe pour un même jeu de trades et mêmes paramètres (graine = empreinte).
+    # Renvoie None si l'historique ne permet pas la simulation.
+    results = np.sort(np.asarray(results, dtype=np.float64))
+    if len(results) == 0 or n_paths <= 0 or horizon <= 0:
+        return None
+    if mode == "r":
+        unit = r_unit(results)
+        if unit <= 0:
+            return None
+        samples = results / unit
+    else:
+        samples = results
+    ruin_level = start_capital * (1 - ruin_pct / 100)
+
+    seed = np.random.SeedSequence(int(trades_fingerprint(results)[:16], 16))
+    if executor is None or workers <= 1 or n_paths < parallel_min_paths:
+        paths = simulate_paths(samples, n_paths, horizon, start_capital, mode, risk_pct, ruin_level, seed)
+    else:
+        # Un bloc de trajectoires par worker, chacun avec sa propre graine dérivée
+        sizes = [n_paths // workers + (1 if i < n_paths % workers else 0) for i in range(workers)]
+        futures = [executor.submit(simulate_paths, samples, size, horizon, start_capital, mode, risk_pct, ruin_level, child)
+                   for size, child in zip(sizes, seed.spawn(workers))]
+        parts = [future.result() for future in futures]
+        paths = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    return _summarize(paths, horizon, start_capital)
+
+
+def _fork_available() -> bool:
+    # fork absent sous Windows, déconseillé sous macOS (même test que auth.py)
+    return sys.platform != "darwin" and "fork" in multiprocessing.get_all_start_methods()
+
+
+def make_executor(workers: int, mode: str = "thread"):
+    # "thread" (défaut) : les opérations NumPy sur les blocs libèrent le GIL. Pas de fork
+    # du serveur Streamlit, déjà multi-threadé : un verrou tenu par un autre thread au
+    # moment du fork resterait pris dans le worker, qui se bloquerait.
+    # "process" : workers forkés, seulement si fork est disponible (sinon threads) ; pas
+    # de "spawn" : Streamlit ferait réexécuter le script à chaque worker.
+    if mode == "process" and _fork_available():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tradeflow-montecarlo")
@@ -0,0 +1,489 @@
+# ============================================
+# STOCKAGE : SUPABASE OU SQLITE EMBARQUÉ
+# ============================================
+# Toutes les requêtes de l'app passent par une instance de Storage.
+# SupabaseStorage : déploiement cloud (PostgREST). SQLiteStorage : base locale
+# indexée, pour l'auto-hébergement, le mode hors-ligne et les tests de charge.
+# Les deux renvoient les mêmes lignes (listes de dicts, mêmes colonnes).
+import sqlite3
+import threading
+
+TRADE_COLUMNS = ['id', 'user_email', 'account_id', 'date', 'pair', 'direction', 'entry_price',
+                 'exit_price', 'lots', 'result', 'timestamp']
+USER_COLUMNS = ['id', 'email', 'password_hash', 'full_name', 'created_at']
+ACCOUNT_COLUMNS = ['id', 'user_email', 'name', 'capital_reel', 'credit_broker', 'created_at']
+GROUP_STAT_COLUMNS = ['user_email', 'pair', 'direction', 'trades', 'wins', 'losers',
+                      'pnl', 'gains', 'losses', 'biggest_win', 'biggest_loss']
+# trades_hourly_rollup : agrégats par (jour, heure UTC du timestamp), tenus à jour par triggers
+ROLLUP_COLUMNS = ['date', 'hour', 'trades', 'wins', 'losers', 'pnl', 'gains', 'losses']
+
+
+class Storage:
+    # Interface commune. columns : liste séparée par des virgules, "*" = toutes.
+    def get_user(self, email: str, columns: str = "*"):
+        raise NotImplementedError
+
+    def create_user(self, user: dict):
+        raise NotImplementedError
+
+    def list_user_emails(self):
+        # Emails de tous les comptes, triés (rapports en lot)
+        raise NotImplementedError
+
+    def list_accounts(self, user_email):
+        # Comptes broker de l'utilisateur (lignes de ACCOUNT_COLUMNS), triés par id
+        raise NotImplementedError
+
+    def create_account(self, account: dict):
+        # Renvoie la ligne créée (avec id)
+        raise NotImplementedError
+
+    def update_account(self, account_id: int, fields: dict):
+        raise NotImplementedError
+
+    def claim_unassigned_trades(self, user_email, account_id: int):
+        # Rattache au compte les trades sans compte (historique antérieur aux comptes)
+        raise NotImplementedError
+
+    def fetch_trade_page(self, user_email, last_id: int, columns: str, limit: int, account_id: int = None):
+        # Trades d'id > last_id, triés par id croissant ; account_id : ceux de ce compte seulement
+        raise NotImplementedError
+
+    def iter_trade_pages(self, user_email, last_id: int = 0, columns: str = "*", page_size: int = 1000,
+                         account_id: int = None):
+        # Pagination keyset sur id, page par page jusqu'à épuisement
+        while True:
+            rows = self.fetch_trade_page(user_email, last_id, columns, page_size, account_id)
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def count_trades(self, user_email):
+        raise NotImplementedError
+
+    def fetch_trades_by_ids(self, trade_ids, columns: str = "*"):
+        raise NotImplementedError
+
+    def insert_trades(self, rows):
+        # Renvoie les lignes insérées (avec id et timestamp attribués par la base)
+        raise NotImplementedError
+
+    def delete_user_trades(self, user_email):
+        # Renvoie le nombre de trades supprimés
+        raise NotImplementedError
+
+    def delete_trades(self, trade_ids):
+        raise NotImplementedError
+
+    def fetch_journal_page(self, user_email, columns: str, date_from, date_to, pairs, directions, cursor, limit: int):
+        # Tri (date, id) décroissants ; cursor = (date, id) de la dernière ligne vue
+        raise NotImplementedError
+
+    def fetch_group_stats(self, user_email):
+        # Lignes de GROUP_STAT_COLUMNS, une par (actif, direction)
+        raise NotImplementedError
+
+    def fetch_result_histogram(self, user_email, bins: int):
+        # Intervalles non vides : {'bucket', 'lower_bound', 'upper_bound', 'trades'}
+        raise NotImplementedError
+
+    def fetch_time_rollup(self, user_email):
+        # Lignes de ROLLUP_COLUMNS triées par (date, heure) ; heure -1 = timestamp absent
+        raise NotImplementedError
+
+
+# ============================================
+# SUPABASE (POSTGREST)
+# ============================================
+class SupabaseStorage(Storage):
+    def __init__(self, url: str, key: str):
+        from supabase import create_client
+        self.client = create_client(url, key)
+
+    def get_user(self, email: str, columns: str = "*"):
+        rows = self.client.table('users').select(columns).eq('email', email).execute().data
+        return rows[0] if rows else None
+
+    def create_user(self, user: dict):
+        self.client.table('users').insert(user).execute()
+
+    def list_user_emails(self, page_size: int = 1000):
+        # Paginé : PostgREST plafonne chaque réponse (max-rows)
+        emails = []
+        while True:
+            rows = self.client.table('users').select('email').order('email') \
+                .range(len(emails), len(emails) + page_size - 1).execute().data
+            emails.extend(row['email'] for row in rows)
+            if len(rows) < page_size:
+                return emails
+
+    def list_accounts(self, user_email):
+        return self.client.table('accounts').select(",".join(ACCOUNT_COLUMNS)).eq('user_email', user_email) \
+            .order('id').execute().data
+
+    def create_account(self, account: dict):
+        response = self.client.table('accounts').insert(account).execute()
+        if not response.data:
+            raise RuntimeError("Erreur d'enregistrement Supabase")
+        return response.data[0]
+
+    def update_account(self, account_id: int, fields: dict):
+        self.client.table('accounts').update(fields, returning="minimal").eq('id', account_id).execute()
+
+    def claim_unassigned_trades(self, user_email, account_id: int):
+        response = self.client.table('trades').update({'account_id': account_id}, count="exact", returning="minimal") \
+            .eq('user_email', user_email).is_('account_id', 'null').execute()
+        return response.count or 0
+
+    def fetch_trade_page(self, user_email, last_id: int, columns: str, limit: int, account_id: int = None):
+        query = self.client.table('trades').select(columns).eq('user_email', user_email)
+        if account_id is not None:
+            query = query.eq('account_id', account_id)
+        return query.gt('id', last_id).order('id').limit(limit).execute().data
+
+    def count_trades(self, user_email):
+        # COUNT seul : en-tête HTTP, aucune ligne transférée
+        return self.client.table('trades').select("id", count="exact", head=True) \
+            .eq('user_email', user_email).execute().count
+
+    def fetch_trades_by_ids(self, trade_ids, columns: str = "*"):
+        return self.client.table('trades').select(columns).in_('id', list(trade_ids)).execute().data
+
+    def insert_trades(self, rows):
+        response = self.client.table('trades').insert(rows).execute()
+        if not response.data:
+            raise RuntimeError("Erreur d'enregistrement Supabase")
+        return response.data
+
+    def delete_user_trades(self, user_email):
+        # Un seul DELETE filtré : une requête, une transaction côté Postgres
+        response = self.client.table('trades').delete(count="exact", returning="minimal") \
+            .eq('user_email', user_email).execute()
+        return response.count or 0
+
+    def delete_trades(self, trade_ids):
+        self.client.table('trades').delete(returning="minimal").in_('id', list(trade_ids)).execute()
+
+    def fetch_journal_page(self, user_email, columns: str, date_from, date_to, pairs, directions, cursor, limit: int):
+        query = self.client.table('trades').select(columns).eq('user_email', user_email)
+        if date_from:
+            query = query.gte('date', date_from)
+        if date_to:
+            query = query.lte('date', date_to)
+        if pairs:
+            query = query.in_('pair', list(pairs))
+        if directions:
+            query = query.in_('direction', list(directions))
+        if cursor is not None:
+            cursor_date, cursor_id = cursor
+            query = query.or_(f"date.lt.{cursor_date},and(date.eq.{cursor_date},id.lt.{cursor_id})")
+        return query.order('date', desc=True).order('id', desc=True).limit(limit).execute().data
+
+    def fetch_group_stats(self, user_email):
+        # Vue de create_analytics_views.sql
+        return self.client.table('trades_group_stats').select("*").eq('user_email', user_email).execute().data
+
+    def fetch_result_histogram(self, user_email, bins: int):
+        return self.client.rpc('trades_result_histogram', {'p_user_email': user_email, 'p_bins': bins}).execute().data
+
+    def fetch_time_rollup(self, user_email, page_size: int = 1000):
+        # Table de la migration 006 ; paginée (une ligne par heure tradée : quelques milliers sur des années)
+        rows = []
+        while True:
+            page = self.client.table('trades_hourly_rollup').select(",".join(ROLLUP_COLUMNS)) \
+                .eq('user_email', user_email).order('date').order('hour') \
+                .range(len(rows), len(rows) + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+
+# ============================================
+# SQLITE EMBARQUÉ
+# ============================================
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    full_name TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    capital_reel REAL NOT NULL DEFAULT 733.18,
+    credit_broker REAL NOT NULL DEFAULT 500.0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    UNIQUE (user_email, name)
+);
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_email TEXT NOT NULL,
+    account_id INTEGER REFERENCES accounts(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    entry_price REAL,
+    exit_price REAL,
+    lots REAL,
+    result REAL NOT NULL,
+    timestamp TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+-- Synchro incrémentale (id > last_id) et COUNT par utilisateur
+CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades(user_email, id);
+-- Journal paginé : tri et curseur keyset (date, id) décroissants
+CREATE INDEX IF NOT EXISTS idx_trades_user_date_id ON trades(user_email, date DESC, id DESC);
+"""
+# Bases créées avant les comptes : colonne ajoutée au démarrage, puis son index
+# (créé après coup : il ne peut pas figurer dans SQLITE_SCHEMA)
+SQLITE_TRADES_ACCOUNT_COLUMN = "ALTER TABLE trades ADD COLUMN account_id INTEGER REFERENCES accounts(id) ON DELETE CASCADE"
+SQLITE_TRADES_ACCOUNT_INDEX = "CREATE INDEX IF NOT EXISTS idx_trades_account_id ON trades(account_id, id)"
+
+# Rollup par (jour, heure UTC) maintenu par triggers : équivalent de la migration 006.
+# Chaque insertion, suppression ou modification de trade ajoute ou retire sa contribution.
+SQLITE_ROLLUP_HOUR = "COALESCE(CAST(strftime('%H', {row}.timestamp) AS INTEGER), -1)"
+SQLITE_ROLLUP_ADD = """
+    INSERT INTO trades_hourly_rollup (user_email, date, hour, trades, wins, losers, pnl, gains, losses)
+    VALUES (NEW.user_email, substr(NEW.date, 1, 10), {hour}, 1, NEW.result > 0, NEW.result < 0, NEW.result,
+            MAX(NEW.result, 0), MIN(NEW.result, 0))
+    ON CONFLICT (user_email, date, hour) DO UPDATE SET
+        trades = trades + excluded.trades, wins = wins + excluded.wins, losers = losers + excluded.losers,
+        pnl = pnl + excluded.pnl, gains = gains + excluded.gains, losses = losses + excluded.losses;
+""".format(hour=SQLITE_ROLLUP_HOUR.format(row="NEW"))
+SQLITE_ROLLUP_REMOVE = """
+    UPDATE trades_hourly_rollup SET
+        trades = trades - 1, wins = wins - (OLD.result > 0), losers = losers - (OLD.result < 0),
+        pnl = pnl - OLD.result, gains = gains - MAX(OLD.result, 0), losses = losses - MIN(OLD.result, 0)
+    WHERE user_email = OLD.user_email AND date = substr(OLD.date, 1, 10) AND hour = {hour};
+    DELETE FROM trades_hourly_rollup
+    WHERE user_email = OLD.user_email AND date = substr(OLD.date, 1, 10) AND hour = {hour} AND trades <= 0;
+""".format(hour=SQLITE_ROLLUP_HOUR.format(row="OLD"))
+SQLITE_ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS trades_hourly_rollup (
+    user_email TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    trades INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losers INTEGER NOT NULL,
+    pnl REAL NOT NULL,
+    gains REAL NOT NULL,
+    losses REAL NOT NULL,
+    PRIMARY KEY (user_email, date, hour)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS trades_rollup_insert AFTER INSERT ON trades BEGIN {SQLITE_ROLLUP_ADD} END;
+CREATE TRIGGER IF NOT EXISTS trades_rollup_delete AFTER DELETE ON trades BEGIN {SQLITE_ROLLUP_REMOVE} END;
+CREATE TRIGGER IF NOT EXISTS trades_rollup_update AFTER UPDATE OF user_email, date, result, timestamp ON trades
+BEGIN {SQLITE_ROLLUP_REMOVE} {SQLITE_ROLLUP_ADD} END;
+"""
+# Base existante sans rollup : table, triggers et rattrapage dans la même transaction
+SQLITE_ROLLUP_BACKFILL = f"""
+INSERT INTO trades_hourly_rollup (user_email, date, hour, trades, wins, losers, pnl, gains, losses)
+SELECT user_email, substr(date, 1, 10), {SQLITE_ROLLUP_HOUR.format(row="trades")}, COUNT(*), SUM(result > 0),
+       SUM(result < 0), SUM(result), TOTAL(MAX(result, 0)), TOTAL(MIN(result, 0))
+FROM trades GROUP BY 1, 2, 3;
+"""
+
+# Au-delà, SQLite refuse la requête (SQLITE_MAX_VARIABLE_NUMBER des anciennes versions)
+SQLITE_MAX_PARAMS = 900
+
+
+class SQLiteStorage(Storage):
+    # Une connexion partagée par le process, protégée par un verrou : SQLite sérialise
+    # de toute façon les écritures, et le mode WAL laisse les lectures concurrentes
+    # aux autres process. path = ":memory:" pour une base éphémère (tests de charge).
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SQLITE_SCHEMA)
+            if 'account_id' not in {row['name'] for row in self._conn.execute("PRAGMA table_info(trades)")}:
+                self._conn.execute(SQLITE_TRADES_ACCOUNT_COLUMN)
+            self._conn.execute(SQLITE_TRADES_ACCOUNT_INDEX)
+            if self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'trades_hourly_rollup'").fetchone():
+                self._conn.executescript(SQLITE_ROLLUP_SCHEMA)
+            else:
+                self._conn.executescript(f"BEGIN IMMEDIATE; {SQLITE_ROLLUP_SCHEMA} {SQLITE_ROLLUP_BACKFILL} COMMIT;")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _columns(columns: str, allowed):
+        # Projection validée (les noms de colonnes ne peuvent pas être paramétrés)
+        if columns.strip() == "*":
+            return "*"
+        names = [name.strip() for name in columns.split(",")]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValueError(f"Colonnes inconnues : {', '.join(unknown)}")
+        return ", ".join(names)
+
+    def get_user(self, email: str, columns: str = "*"):
+        rows = self._query(f"SELECT {self._columns(columns, USER_COLUMNS)} FROM users WHERE email = ?", (email,))
+        return rows[0] if rows else None
+
+    def create_user(self, user: dict):
+        names = [self._columns(name, USER_COLUMNS) for name in user]
+        with self._lock:
+            self._conn.execute(f"INSERT INTO users ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                               tuple(user.values()))
+
+    def list_user_emails(self):
+        return [row['email'] for row in self._query("SELECT email FROM users ORDER BY email")]
+
+    def list_accounts(self, user_email):
+        return self._query(f"SELECT {', '.join(ACCOUNT_COLUMNS)} FROM accounts WHERE user_email = ? ORDER BY id",
+                           (user_email,))
+
+    def create_account(self, account: dict):
+        names = [self._columns(name, ACCOUNT_COLUMNS) for name in account]
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT INTO accounts ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) RETURNING *",
+                tuple(account.values()))
+            return dict(cursor.fetchone())
+
+    def update_account(self, account_id: int, fields: dict):
+        assignments = [f"{self._columns(name, ACCOUNT_COLUMNS)} = ?" for name in fields]
+        with self._lock:
+            self._conn.execute(f"UPDATE accounts SET {', '.join(assignments)} WHERE id = ?",
+                               (*fields.values(), account_id))
+
+    def claim_unassigned_trades(self, user_email, account_id: int):
+        with self._lock:
+            return self._conn.execute("UPDATE trades SET account_id = ? WHERE user_email = ? AND account_id IS NULL",
+                                      (account_id, user_email)).rowcount
+
+    def fetch_trade_page(self, user_email, last_id: int, columns: str, limit: int, account_id: int = None):
+        # Par compte : parcours de idx_trades_account_id (account_id, id)
+        if account_id is not None:
+            return self._query(f"SELECT {self._columns(columns, TRADE_COLUMNS)} FROM trades "
+                               "WHERE account_id = ? AND user_email = ? AND id > ? ORDER BY id LIMIT ?",
+                               (account_id, user_email, last_id, limit))
+        return self._query(f"SELECT {self._columns(columns, TRADE_COLUMNS)} FROM trades "
+                           "WHERE user_email = ? AND id > ? ORDER BY id LIMIT ?", (user_email, last_id, limit))
+
+    def count_trades(self, user_email):
+        return self._query("SELECT COUNT(*) AS n FROM trades WHERE user_email = ?", (user_email,))[0]['n']
+
+    def fetch_trades_by_ids(self, trade_ids, columns: str = "*"):
+        trade_ids = list(trade_ids)
+        projection = self._columns(columns, TRADE_COLUMNS)
+        rows = []
+        for i in range(0, len(trade_ids), SQLITE_MAX_PARAMS):
+            chunk = trade_ids[i:i + SQLITE_MAX_PARAMS]
+            rows += self._query(f"SELECT {projection} FROM trades WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        return rows
+
+    def insert_trades(self, rows):
+        # Une transaction pour tout le lot ; RETURNING renvoie id et timestamp attribués
+        inserted = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    names = [self._columns(name, TRADE_COLUMNS) for name in row]
+                    cursor = self._conn.execute(
+                        f"INSERT INTO trades ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) RETURNING *",
+                        tuple(row.values()))
+                    inserted.append(dict(cursor.fetchone()))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def delete_user_trades(self, user_email):
+        with self._lock:
+            return self._conn.execute("DELETE FROM trades WHERE user_email = ?", (user_email,)).rowcount
+
+    def delete_trades(self, trade_ids):
+        trade_ids = list(trade_ids)
+        with self._lock:
+            for i in range(0, len(trade_ids), SQLITE_MAX_PARAMS):
+                chunk = trade_ids[i:i + SQLITE_MAX_PARAMS]
+                self._conn.execute(f"DELETE FROM trades WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+
+    def fetch_journal_page(self, user_email, columns: str, date_from, date_to, pairs, directions, cursor, limit: int):
+        where, params = ["user_email = ?"], [user_email]
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        if pairs:
+            where.append(f"pair IN ({', '.join('?' * len(pairs))})")
+            params += list(pairs)
+        if directions:
+            where.append(f"direction IN ({', '.join('?' * len(directions))})")
+            params += list(directions)
+        if cursor is not None:
+            # Comparaison de tuples : parcours direct de idx_trades_user_date_id
+            where.append("(date, id) < (?, ?)")
+            params += list(cursor)
+        return self._query(f"SELECT {self._columns(columns, TRADE_COLUMNS)} FROM trades WHERE {' AND '.join(where)} "
+                           "ORDER BY date DESC, id DESC LIMIT ?", params + [limit])
+
+    def fetch_group_stats(self, user_email):
+        # Équivalent de la vue trades_group_stats
+        return self._query("""
+            SELECT user_email, pair, direction,
+                   COUNT(*) AS trades,
+                   SUM(result > 0) AS wins,
+                   SUM(result < 0) AS losers,
+                   SUM(result) AS pnl,
+                   TOTAL(CASE WHEN result > 0 THEN result END) AS gains,
+                   TOTAL(CASE WHEN result < 0 THEN result END) AS losses,
+                   MAX(result) AS biggest_win,
+                   MIN(result) AS biggest_loss
+            FROM trades WHERE user_email = ?
+            GROUP BY pair, direction""", (user_email,))
+
+    def fetch_result_histogram(self, user_email, bins: int):
+        # Équivalent de la fonction trades_result_histogram (bornes de numpy.histogram)
+        return self._query("""
+            WITH bounds AS (
+                SELECT CASE WHEN MAX(result) > MIN(result) THEN MIN(result) ELSE MIN(result) - 0.5 END AS lo,
+                       CASE WHEN MAX(result) > MIN(result) THEN MAX(result) ELSE MAX(result) + 0.5 END AS hi
+                FROM trades WHERE user_email = :user_email
+            ), buckets AS (
+                SELECT MIN(CAST((t.result - bounds.lo) * :bins / (bounds.hi - bounds.lo) AS INTEGER) + 1, :bins) AS bucket,
+                       COUNT(*) AS trades
+                FROM trades t, bounds
+                WHERE t.user_email = :user_email
+                GROUP BY 1
+            )
+            SELECT b.bucket,
+                   bounds.lo + (b.bucket - 1) * (bounds.hi - bounds.lo) / :bins AS lower_bound,
+                   bounds.lo + b.bucket * (bounds.hi - bounds.lo) / :bins AS upper_bound,
+                   b.trades
+            FROM buckets b, bounds
+            ORDER BY b.bucket""", {'user_email': user_email, 'bins': bins})
+
+    def fetch_time_rollup(self, user_email):
+        return self._query(f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM trades_hourly_rollup "
+                           "WHERE user_email = ? ORDER BY date, hour", (user_email,))
+
+
+# ============================================
+# INSTRUMENTATION
+# ============================================
+class InstrumentedStorage(Storage):
+    # Délègue à un autre Storage en chronométrant chaque requête ("db.<méthode>").
+    # stats : objet exposant timed(nom) (metrics.LatencyStats). iter_trade_pages reste
+    # celui de la classe de base : chaque page passe par le fetch_trade_page mesuré.
+    def __init__(self, inner: Storage, stats):
+        self.inner = inner
+        for name, member in vars(Storage).items():
+            if callable(member) and not name.startswith('_') and name != 'iter_trade_pages':
+                setattr(self, name, stats.timed(f"db.{name}")(getattr(inner, name)))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules de l'app (analytics, trade_import, ...) importables depuis tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+import os
+
+import pandas as pd
+import pytest
+
+from analytics import merge_trades
+from trade_import import _parse_numbers, duplicate_mask, parse_trades_file, trade_keys
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def stored_trades(trades, first_id=1):
+    # Trades tels que relus depuis le cache après insertion (ids, colonnes typées)
+    rows = [dict(row, id=first_id + i, account_id=1) for i, row in enumerate(trades.to_dict('records'))]
+    return merge_trades(pd.DataFrame(), rows)
+
+
+def test_csv():
+    trades, rejected = parse_trades_file(read_fixture("statement.csv"), "statement.csv")
+
+    assert rejected == {"actif non supporté": 1}
+    assert trades['pair'].tolist() == ['XAUUSD', 'NAS100', 'XAUUSD', 'BTCUSD']
+    assert trades['direction'].tolist() == ['Long', 'Short', 'Long', 'Short']
+    # Virgule des milliers dans un CSV en ','
+    assert trades['entry_price'].tolist() == [2100.5, 18250.0, 2100.5, 65000.0]
+    assert trades['result'].tolist() == [97.5, 25.0, 97.5, 10.0]
+    # Sans heure dans le fichier : pas de timestamp
+    assert trades['timestamp'].isna().all()
+
+
+def test_european_csv_decimal_comma():
+    trades, rejected = parse_trades_file(read_fixture("statement_eu.csv"), "statement_eu.csv")
+
+    assert rejected == {}
+    assert trades['pair'].tolist() == ['DAX40', 'XAUUSD', 'DJ30']
+    assert trades['lots'].tolist() == [0.1, 1.0, 0.5]
+    assert trades['entry_price'].tolist() == [17850.5, 2000.5, 38900.0]
+    assert trades['exit_price'].tolist() == [17901.25, 1998.25, 38850.0]
+    # Profit + commission + swap
+    assert trades['result'].tolist() == [98.5, 221.25, -1235.56]
+
+
+@pytest.mark.parametrize("text, decimal_comma, expected", [
+    ("100,00", True, 100.0),
+    ("-1,5", True, -1.5),
+    ("1.234,56", True, 1234.56),
+    ("1 234,56 €", True, 1234.56),
+    ("12.5", True, 12.5),
+    ("1,234.56", False, 1234.56),
+    ("1.234,56", False, 1234.56),
+    ("+12.50 €", False, 12.5),
+    ("0.10 / 0.10", False, 0.1),
+])
+def test_parse_numbers(text, decimal_comma, expected):
+    assert _parse_numbers(pd.Series([text]), decimal_comma).iloc[0] == pytest.approx(expected)
+
+
+def test_mt4_html():
+    trades, rejected = parse_trades_file(read_fixture("statement_mt4.htm"), "statement_mt4.htm")
+
+    # Ligne de totaux et section "Open Trades" ignorées
+    assert rejected == {}
+    assert trades['date'].tolist() == ['2024-01-15', '2024-01-16', '2024-01-18']
+    assert trades['pair'].tolist() == ['XAUUSD', 'DAX40', 'DJ30']
+    assert trades['direction'].tolist() == ['Long', 'Short', 'Long']
+    assert trades['lots'].tolist() == [0.1, 1.0, 0.5]
+    assert trades['entry_price'].tolist() == [2050.1, 16650.0, 37600.0]
+    assert trades['exit_price'].tolist() == [2061.4, 16675.5, 37710.0]
+    assert trades['result'].tolist() == [112.3, -28.6, 1105.3]
+    assert trades['timestamp'].tolist()[0] == '2024-01-15T14:05:00'
+
+
+def test_duplicates_within_file():
+    trades, _ = parse_trades_file(read_fixture("statement.csv"), "statement.csv")
+
+    assert duplicate_mask(trades, pd.DataFrame()).tolist() == [False, False, True, False]
+
+
+@pytest.mark.parametrize("name", ["statement.csv", "statement_eu.csv", "statement_mt4.htm"])
+def test_reimport_same_file_adds_nothing(name):
+    trades, _ = parse_trades_file(read_fixture(name), name)
+    first_import = trades[~duplicate_mask(trades, pd.DataFrame())]
+    existing = stored_trades(first_import)
+
+    trades_again, _ = parse_trades_file(read_fixture(name), name)
+    assert duplicate_mask(trades_again, existing).all()
+
+
+def test_reimport_keeps_new_trades():
+    trades, _ = parse_trades_file(read_fixture("statement_mt4.htm"), "statement_mt4.htm")
+    existing = stored_trades(trades.iloc[:2])
+
+    assert duplicate_mask(trades, existing).tolist() == [True, True, False]
+
+
+def test_trade_keys_match_cache_precision():
+    # Prix relus en float32 depuis le cache : même clé que le fichier d'origine
+    trades, _ = parse_trades_file(read_fixture("statement_mt4.htm"), "statement_mt4.htm")
+    stored = stored_trades(trades).sort_values('id', ignore_index=True)
+
+    assert trade_keys(trades).equals(trade_keys(stored))
@@ -0,0 +1,185 @@
+# ============================================
+# IMPORT DE TRADES (CSV / MT4 / MT5)
+# ============================================
+# Lecture et normalisation des relevés broker, sans Streamlit : app.py insère le
+# résultat en base, les tests l'appellent directement.
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+from analytics import ASSET_CONFIG
+
+# Symboles courants chez les brokers -> clé ASSET_CONFIG
+SYMBOL_ALIASES = {
+    "GOLD": "XAUUSD",
+    "US30": "DJ30", "WS30": "DJ30", "DOW": "DJ30", "DJI": "DJ30", "USA30": "DJ30",
+    "GER40": "DAX40", "DE40": "DAX40", "GER30": "DAX40", "DE30": "DAX40", "DAX": "DAX40",
+    "US100": "NAS100", "USTEC": "NAS100", "NDX": "NAS100", "NAS": "NAS100", "USA100": "NAS100",
+    "BTCUSDT": "BTCUSD", "BITCOIN": "BTCUSD", "XBTUSD": "BTCUSD",
+    "ETHUSDT": "ETHUSD", "ETHEREUM": "ETHUSD",
+}
+
+# Colonnes acceptées (en minuscules), par ordre de priorité.
+# "time.1"/"price.1" : seconde occurrence dans les rapports MT4/MT5 (clôture).
+IMPORT_COLUMNS = {
+    'date': ['date', 'close time', 'close_time', 'closetime', 'time.1', 'open time', 'time'],
+    'pair': ['pair', 'asset', 'symbol', 'item', 'instrument'],
+    'direction': ['direction', 'type', 'side'],
+    'entry_price': ['entry_price', 'entry', 'open price', 'price'],
+    'exit_price': ['exit_price', 'exit', 'close price', 'price.1'],
+    'lots': ['lots', 'volume', 'size'],
+    'result': ['result', 'p&l', 'pnl', 'profit'],
+}
+# Frais des relevés broker, ajoutés au profit brut
+IMPORT_COST_COLUMNS = ['commission', 'swap', 'taxes', 'fee']
+
+def normalize_symbol(symbol: str):
+    clean = "".join(ch for ch in str(symbol).upper().split(".")[0] if ch.isalnum())
+    if clean in ASSET_CONFIG:
+        return clean
+    if clean in SYMBOL_ALIASES:
+        return SYMBOL_ALIASES[clean]
+    # Suffixes de compte (XAUUSDm, NAS100cash, ...)
+    for key in list(ASSET_CONFIG) + list(SYMBOL_ALIASES):
+        if clean.startswith(key):
+            return SYMBOL_ALIASES.get(key, key)
+    return None
+
+def _dedupe_columns(columns):
+    # Les rapports MT4/MT5 ont deux colonnes "Time" et "Price" (ouverture / clôture)
+    seen = {}
+    result = []
+    for col in columns:
+        col = str(col).strip().lower()
+        result.append(col if col not in seen else f"{col}.{seen[col]}")
+        seen[col] = seen.get(col, 0) + 1
+    return result
+
+def _read_statement_html(data: bytes):
+    # Rapport HTML MT4/MT5 : on cherche la ligne d'en-tête du tableau des positions
+    # et on s'arrête à la première ligne dont la date n'est pas lisible
+    # (lignes de totaux, sections "Orders"/"Deals"/"Open Trades").
+    for table in pd.read_html(io.BytesIO(data), header=None):
+        table = table.astype(str)
+        for idx in range(min(len(table), 30)):
+            header = [cell.strip().lower() for cell in table.iloc[idx]]
+            if 'profit' in header and ('symbol' in header or 'item' in header):
+                body = table.iloc[idx + 1:].reset_index(drop=True)
+                body.columns = _dedupe_columns(header)
+                date_col = next(c for c in ('open time', 'time') if c in body.columns)
+                dates = _parse_dates(body[date_col])
+                stop = dates.isna().to_numpy().argmax() if dates.isna().any() else len(body)
+                return body.iloc[:stop]
+    return pd.DataFrame()
+
+def _read_statement_csv(data: bytes):
+    # Les exports MT5 sont en UTF-16, les CSV "européens" en ';' avec virgule décimale.
+    # Renvoie (colonnes brutes en texte, virgule décimale ou non)
+    encoding = 'utf-16' if data[:2] in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig'
+    text = data.decode(encoding, errors='replace')
+    try:
+        sep = csv.Sniffer().sniff(text[:4096], delimiters=",;\t").delimiter
+    except csv.Error:
+        sep = ","
+    raw = pd.read_csv(io.StringIO(text), sep=sep, dtype=str)
+    raw.columns = _dedupe_columns(raw.columns)
+    return raw, sep == ';'
+
+def _parse_dates(series):
+    # "2024.01.15 10:32" (MT4/MT5) -> "2024-01-15 10:32"
+    text = series.astype(str).str.strip().str.replace(r'^(\d{4})\.(\d{2})\.(\d{2})', r'\1-\2-\3', regex=True)
+    dates = pd.to_datetime(text, errors='coerce', format='ISO8601')
+    if dates.isna().mean() > 0.5:
+        dates = pd.to_datetime(text, errors='coerce', dayfirst=True, format='mixed')
+    return dates
+
+def _parse_numbers(series, decimal_comma: bool = False):
+    # "+12.50 €", "1 234.00", "0.10 / 0.10" -> float. Virgule décimale : "1.234,56", et
+    # "100,00" si decimal_comma (CSV en ';') ; sinon une virgule seule sépare les milliers
+    text = series.astype(str).str.split('/').str[0].str.replace(r"[\s']", '', regex=True)
+    last_comma, last_dot = text.str.rfind(','), text.str.rfind('.')
+    comma_decimal = (last_comma > last_dot) & ((last_dot >= 0) | decimal_comma)
+    text = text.where(~comma_decimal, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(text.str.replace(r'[^0-9.eE+\-]', '', regex=True), errors='coerce')
+
+def _pick_column(raw, field):
+    for candidate in IMPORT_COLUMNS[field]:
+        if candidate in raw.columns:
+            return candidate
+    return None
+
+def parse_trades_file(data: bytes, filename: str):
+    # Renvoie (DataFrame normalisé prêt à insérer, {raison de rejet: nombre})
+    if filename.lower().endswith(('.htm', '.html')):
+        raw, decimal_comma = _read_statement_html(data), False
+    else:
+        raw, decimal_comma = _read_statement_csv(data)
+
+    columns = {field: _pick_column(raw, field) for field in IMPORT_COLUMNS}
+    missing = [field for field in ('date', 'pair', 'direction', 'result') if columns[field] is None]
+    if raw.empty or missing:
+        return pd.DataFrame(), {f"colonnes manquantes : {', '.join(missing) or 'aucune ligne'}": len(raw)}
+
+    dates = _parse_dates(raw[columns['date']])
+    pairs = raw[columns['pair']].map({s: normalize_symbol(s) for s in raw[columns['pair']].unique()})
+    directions = raw[columns['direction']].astype(str).str.strip().str.lower().str.split().str[0] \
+        .map({'buy': 'Long', 'long': 'Long', 'sell': 'Short', 'short': 'Short'})
+    result = _parse_numbers(raw[columns['result']], decimal_comma)
+    if columns['result'] == 'profit':
+        for cost in IMPORT_COST_COLUMNS:
+            if cost in raw.columns:
+                result = result + _parse_numbers(raw[cost], decimal_comma).fillna(0.0)
+    prices = {field: _parse_numbers(raw[columns[field]], decimal_comma) if columns[field]
+              else pd.Series(float('nan'), index=raw.index)
+              for field in ('entry_price', 'exit_price', 'lots')}
+
+    checks = [
+        ("date invalide", dates.isna()),
+        ("actif non supporté", pairs.isna()),
+        ("direction invalide", directions.isna()),
+        ("P&L invalide", result.isna()),
+        ("prix d'entrée/sortie manquants", ~((prices['entry_price'] > 0) & (prices['exit_price'] > 0))),
+    ]
+    rejected = {}
+    invalid = pd.Series(False, index=raw.index)
+    for reason, mask in checks:
+        new_invalid = mask & ~invalid
+        if new_invalid.any():
+            rejected[reason] = int(new_invalid.sum())
+        invalid |= mask
+
+    # Sans heure dans le fichier, pas de timestamp : ces trades restent hors des analyses par heure / session
+    has_time = (dates.dt.hour + dates.dt.minute + dates.dt.second).fillna(0).gt(0).any()
+    trades = pd.DataFrame({
+        'date': dates.dt.strftime("%Y-%m-%d"),
+        'pair': pairs,
+        'direction': directions,
+        'entry_price': prices['entry_price'],
+        'exit_price': prices['exit_price'],
+        'lots': prices['lots'].fillna(0.01),
+        'result': result.round(2),
+        'timestamp': dates.map(lambda d: d.isoformat()) if has_time else None,
+    })[~invalid].reset_index(drop=True)
+    return trades, rejected
+
+def trade_keys(trades_df):
+    # Clé de dédoublonnage ; prix comparés en float32, la précision du cache des trades
+    return pd.MultiIndex.from_arrays([
+        pd.to_datetime(trades_df['date'], format='ISO8601').to_numpy().astype('datetime64[D]'),
+        trades_df['pair'].astype(str),
+        trades_df['direction'].astype(str),
+        trades_df['entry_price'].astype(np.float32),
+        trades_df['exit_price'].astype(np.float32),
+        trades_df['result'].astype(float).round(2),
+    ])
+
+def duplicate_mask(trades, existing_df):
+    # Lignes à ne pas insérer : doublons dans le fichier ou déjà présentes dans existing_df
+    # (trades du compte cible, même format que le cache des trades)
+    keys = trade_keys(trades)
+    duplicate = keys.duplicated()
+    if not existing_df.empty:
+        duplicate |= keys.isin(trade_keys(existing_df))
+    return duplicate